@@ -0,0 +1,230 @@
+"""recommend counter teams for a stream of enemy teams without the game window
+
+Reads one enemy team per line, as JSON lines or csv, from a file or stdin, and writes one JSON
+result per line as soon as it is ready:
+
+    python batch_recommend.py teams.jsonl --workers 4 > results.jsonl
+    python batch_recommend.py --format csv < teams.csv
+
+A JSON line is either a list of Pokemon (names or ids) or an object with a "team" list and an
+optional "id" that is copied to the result. A csv row holds the team's Pokemon in its cells.
+Teams are processed in chunks, so memory use does not grow with the length of the input.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import sys
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterable, Iterator, Optional, TextIO
+
+from pokemon_data_scraper import load_pokedex
+from pokemon_final_team import get_user_pokemon, get_pokemon
+from graph_algorithm import cached_graph_builder
+from instrumentation import trace, profile, TRACE_REQUESTS
+
+# one parsed input line: (line number, id copied to the result or None, team or the reason it is invalid)
+Record = tuple[int, Any, Any]
+
+
+def read_jsonl(lines: Iterable[str]) -> Iterator[Record]:
+    """Yield the team on every non-blank JSON line"""
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError as error:
+            yield line_number, None, f"invalid JSON: {error}"
+            continue
+        if isinstance(value, dict):
+            yield line_number, value.get("id"), value.get("team")
+        else:
+            yield line_number, None, value
+
+
+def read_csv(lines: Iterable[str], skip_header: bool = False) -> Iterator[Record]:
+    """Yield the team in every non-blank csv row, ignoring empty cells"""
+    reader = csv.reader(lines)
+    if skip_header:
+        next(reader, None)
+    for row in reader:
+        team = [cell.strip() for cell in row if cell.strip()]
+        if team:
+            yield reader.line_num, None, team
+
+
+def chunked(records: Iterable[Record], size: int) -> Iterator[list[Record]]:
+    """Yield records in lists of size (the last one may be shorter)"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def resolve_team(team: Any, file_pokemon: str) -> list[int]:
+    """Return the ids of the Pokemon in team, given by name or id
+
+    Raises ValueError if team is not a list of 1 to 6 known Pokemon.
+    """
+    if not isinstance(team, list) or not 1 <= len(team) <= 6:
+        raise ValueError("a team must be a list of 1 to 6 Pokemon")
+    dex = load_pokedex(file_pokemon)
+    ids = []
+    for pokemon in team:
+        if isinstance(pokemon, bool):  # a bool is an int, but true is not Pokemon 1
+            raise ValueError(f"unknown Pokemon: {json.dumps(pokemon)}")
+        if isinstance(pokemon, str) and pokemon.strip().isdigit():
+            pokemon = int(pokemon)
+        row = dex.get(pokemon) if isinstance(pokemon, int) else dex.get_by_name(str(pokemon))
+        if row is None:
+            raise ValueError(f"unknown Pokemon: {pokemon}")
+        ids.append(row[0])
+    return ids
+
+
+def recommend_record(record: Record, file_pokemon: str, file_types: str, assignment: str,
+                     traced: bool = False) -> dict:
+    """Return the JSON result for one input record, with a summary of where its time went if traced"""
+    with trace(f"line {record[0]}", traced) as record_trace:
+        result = _recommend_record(record, file_pokemon, file_types, assignment)
+    if record_trace is not None:
+        result["trace"] = record_trace.summary()
+    return result
+
+
+def _recommend_record(record: Record, file_pokemon: str, file_types: str, assignment: str) -> dict:
+    """Return the JSON result for one input record"""
+    line_number, record_id, team = record
+    result = {"line": line_number}
+    if record_id is not None:
+        result["id"] = record_id
+    result["team"] = team
+    if isinstance(team, str):  # the line could not be parsed
+        result["team"] = None
+        result["error"] = team
+        return result
+    try:
+        enemies = get_pokemon(resolve_team(team, file_pokemon), file_pokemon)
+        user_team, matchups = get_user_pokemon(enemies, file_pokemon, file_types, assignment)
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+    except Exception as error:  # pylint: disable=broad-except
+        # one failing line should not stop the rest of the stream, as in recommend_service
+        result["error"] = f"internal error: {type(error).__name__}: {error}"
+        return result
+    result["user_team"] = user_team
+    result["matchups"] = [{"user_type": user_type, "enemy_type": enemy_type} for user_type, enemy_type in matchups]
+    return result
+
+
+def recommend_chunk(chunk: list[Record], file_pokemon: str, file_types: str, assignment: str,
+                    traced: bool = False) -> list[str]:
+    """Return the JSON lines for a chunk of records (sent back from worker processes already encoded)"""
+    return [json.dumps(recommend_record(record, file_pokemon, file_types, assignment, traced)) for record in chunk]
+
+
+def warm_worker(file_pokemon: str, file_types: str) -> None:
+    """Load the dex and type chart once when a worker process starts"""
+    load_pokedex(file_pokemon)
+    cached_graph_builder(file_types)
+
+
+def ordered_map(executor: Executor, func: Callable, items: Iterable, max_pending: int) -> Iterator:
+    """Yield func(item) for every item in order, keeping at most max_pending items in flight
+
+    Unlike Executor.map, items are only taken from the iterable as results are consumed.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def recommend_stream(records: Iterable[Record], file_pokemon: str = 'pokemon_data.csv',
+                     file_types: str = 'chart.csv', assignment: str = 'greedy', workers: int = 1,
+                     chunk_size: int = 256, traced: bool = False) -> Iterator[str]:
+    """Yield the JSON result line for every record, in input order
+
+    With more than one worker, chunks of chunk_size records are spread over a process pool. If traced,
+    every result holds the trace summary of its record.
+    """
+    work = partial(recommend_chunk, file_pokemon=file_pokemon, file_types=file_types, assignment=assignment,
+                   traced=traced)
+    chunks = chunked(records, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from work(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_worker,
+                             initargs=(file_pokemon, file_types)) as executor:
+        for lines in ordered_map(executor, work, chunks, 2 * workers):
+            yield from lines
+
+
+def write_lines(lines: Iterable[str], output: TextIO, flush_every: int = 256) -> int:
+    """Write lines to output as they arrive and return how many were written"""
+    count = 0
+    for count, line in enumerate(lines, 1):
+        output.write(line + "\n")
+        if count % flush_every == 0:
+            output.flush()
+    output.flush()
+    return count
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Run the command line interface"""
+    parser = argparse.ArgumentParser(description="Recommend counter teams for a stream of enemy teams.")
+    parser.add_argument("input", nargs="?", default="-", help="file of enemy teams, or - for stdin (default)")
+    parser.add_argument("-o", "--output", default="-", help="file to write results to, or - for stdout (default)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default=None,
+                        help="input format (default: from the file extension, jsonl for stdin)")
+    parser.add_argument("--skip-header", action="store_true", help="skip the first csv row")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=256, help="teams sent to a worker at once")
+    parser.add_argument("--assignment", choices=("greedy", "optimal", "exact"), default="greedy",
+                        help="how recommended types are paired with enemies, or exact for the best team "
+                             "found by searching the whole dex")
+    parser.add_argument("--pokemon", default="pokemon_data.csv", help="Pokemon data file")
+    parser.add_argument("--chart", default="chart.csv", help="type chart file")
+    parser.add_argument("--trace", action="store_true", default=TRACE_REQUESTS,
+                        help="add a summary of stage timings and counters to every result")
+    parser.add_argument("--profile", help="write cProfile statistics of the run to this file")
+    parser.add_argument("--folded", help="write the run's stage timings as folded stacks for a flamegraph")
+    args = parser.parse_args(argv)
+    if (args.profile or args.folded) and args.workers > 1:
+        parser.error("--profile and --folded only see this process, so they need --workers 1")
+
+    input_format = args.format or ("csv" if args.input.endswith(".csv") else "jsonl")
+    source = sys.stdin if args.input == "-" else open(args.input, newline="")
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        with contextlib.ExitStack() as stack:
+            if args.profile:
+                stack.enter_context(profile(args.profile))
+            run_trace = stack.enter_context(trace(args.input, bool(args.folded)))
+            records = read_csv(source, args.skip_header) if input_format == "csv" else read_jsonl(source)
+            write_lines(recommend_stream(records, args.pokemon, args.chart, args.assignment, args.workers,
+                                         args.chunk_size, args.trace), output)
+        if run_trace is not None:
+            run_trace.write_folded(args.folded)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""reproducible benchmarks of the recommendation pipeline
+
+    python benchmarks.py --save baseline.json
+    python benchmarks.py --compare baseline.json --threshold 0.1
+
+Inputs are random teams of 1 to 6 mono and dual typings (or Pokemon) drawn from a seeded generator,
+so every run measures the same work. Each case reports operations per second, latency percentiles
+and the peak memory allocated by a single operation. With --compare, cases whose throughput fell or
+whose median latency rose by more than the threshold are flagged and the exit status is 1.
+"""
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Optional
+
+from graph_algorithm import graph_builder, cached_graph_builder, cached_matrix_builder, strong_weak, \
+    score_candidate, recommend_top_types, RECOMMENDATION_CACHE
+from pokemon_data_scraper import load_pokedex
+from pokemon_final_team import get_pokemon, get_user_pokemon, USER_TEAM_CACHE
+
+CASES = ("graph_builder", "strong_weak", "score_candidate", "recommend_top_types", "get_pokemon",
+         "get_user_pokemon")
+# graph_builder rebuilds the whole chart, so it runs fewer times than the per-team cases
+OPS_SCALE = {"graph_builder": 0.1}
+
+
+def random_typing(rng: random.Random, types: list[str]) -> str | tuple[str, str]:
+    """Return a random mono typing or, half of the time, a random dual typing"""
+    if rng.random() < 0.5:
+        return rng.choice(types)
+    return tuple(rng.sample(types, 2))
+
+
+def random_type_team(rng: random.Random, types: list[str]) -> list:
+    """Return a team of 1 to 6 random typings"""
+    return [random_typing(rng, types) for _ in range(rng.randint(1, 6))]
+
+
+def build_case(name: str, rng: random.Random, ops: int, file_pokemon: str,
+               file_types: str) -> list[Callable[[], Any]]:
+    """Return ops zero-argument calls of the function benchmarked by case name, on seeded random inputs"""
+    types = list(cached_matrix_builder(file_types).types)
+    ids = [row[0] for row in load_pokedex(file_pokemon).rows]
+    graph = cached_graph_builder(file_types)
+    calls = []
+    for _ in range(ops):
+        if name == "graph_builder":
+            calls.append(lambda: graph_builder(file_types))
+        elif name == "strong_weak":
+            team = random_type_team(rng, types)
+            calls.append(lambda team=team: strong_weak(team))
+        elif name == "score_candidate":
+            candidate, team = random_typing(rng, types), random_type_team(rng, types)
+            calls.append(lambda candidate=candidate, team=team: score_candidate(graph, candidate, team))
+        elif name == "recommend_top_types":
+            team = random_type_team(rng, types)
+            calls.append(lambda team=team: recommend_top_types(team, file_types, len(team)))
+        elif name == "get_pokemon":
+            team = rng.sample(ids, rng.randint(1, 6))
+            calls.append(lambda team=team: get_pokemon(team, file_pokemon))
+        elif name == "get_user_pokemon":
+            team = rng.sample(ids, rng.randint(1, 6))
+            calls.append(lambda team=team: get_user_pokemon(get_pokemon(team, file_pokemon), file_pokemon,
+                                                            file_types))
+        else:
+            raise ValueError(f"unknown benchmark case: {name}")
+    return calls
+
+
+def clear_result_caches() -> None:
+    """Drop cached recommendations so every call does the full computation"""
+    RECOMMENDATION_CACHE.clear()
+    USER_TEAM_CACHE.clear()
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Return the q-th percentile of the sorted values by the nearest rank"""
+    return values[max(math.ceil(q / 100 * len(values)) - 1, 0)]
+
+
+def measure(calls: list[Callable[[], Any]], warm: bool = False, warmup: int = 5) -> dict[str, float]:
+    """Return the throughput, latency percentiles and peak memory of running every call once
+
+    Unless warm is set, result caches are cleared (outside the timed region) before every call.
+    Memory is measured in a second pass, since tracemalloc slows the calls it traces.
+    """
+    for call in calls[:warmup]:
+        call()
+    latencies = []
+    for call in calls:
+        if not warm:
+            clear_result_caches()
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for call in calls[:max(len(calls) // 10, 1)]:
+            if not warm:
+                clear_result_caches()
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            call()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    total = sum(latencies)
+    latencies.sort()
+    return {"ops": len(calls), "ops_per_sec": len(calls) / total if total else 0.0,
+            "mean_ms": total / len(calls) * 1000, "p50_ms": percentile(latencies, 50) * 1000,
+            "p90_ms": percentile(latencies, 90) * 1000, "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": latencies[-1] * 1000, "peak_kib": peak / 1024}
+
+
+def run_benchmarks(cases: tuple[str, ...] = CASES, seed: int = 0, ops: int = 500, warm: bool = False,
+                   file_pokemon: str = 'pokemon_data.csv', file_types: str = 'chart.csv') -> dict[str, Any]:
+    """Return the measurements of every case along with what they were measured on"""
+    results = {}
+    for name in cases:
+        rng = random.Random(f"{seed}:{name}")  # each case gets the same inputs whichever cases run
+        calls = build_case(name, rng, max(int(ops * OPS_SCALE.get(name, 1)), 1), file_pokemon, file_types)
+        results[name] = measure(calls, warm)
+    return {"meta": {"seed": seed, "ops": ops, "warm": warm, "python": platform.python_version(),
+                     "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "results": results}
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], threshold: float) -> list[str]:
+    """Return the names of cases that regressed by more than threshold (a fraction) against baseline
+
+    A case regresses when its throughput falls or its median latency rises by more than threshold.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        slower = base["ops_per_sec"] and result["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold)
+        later = base["p50_ms"] and result["p50_ms"] > base["p50_ms"] * (1 + threshold)
+        if slower or later:
+            regressions.append(name)
+    return regressions
+
+
+def print_report(report: dict[str, Any], baseline: Optional[dict[str, Any]] = None,
+                 regressions: tuple[str, ...] = ()) -> None:
+    """Print a table of the results, with the change in throughput against baseline if given"""
+    print(f"{'case':<22}{'ops/s':>12}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'peak KiB':>11}"
+          + (f"{'vs base':>10}" if baseline else ""))
+    for name, result in report["results"].items():
+        line = (f"{name:<22}{result['ops_per_sec']:>12.1f}{result['p50_ms']:>10.3f}{result['p90_ms']:>10.3f}"
+                f"{result['p99_ms']:>10.3f}{result['peak_kib']:>11.1f}")
+        base = baseline["results"].get(name) if baseline else None
+        if base and base["ops_per_sec"]:
+            line += f"{(result['ops_per_sec'] / base['ops_per_sec'] - 1) * 100:>+9.1f}%"
+        if name in regressions:
+            line += "  REGRESSION"
+        print(line)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the benchmarks and return the exit status"""
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation pipeline.")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random teams")
+    parser.add_argument("--ops", type=int, default=500, help="calls per case")
+    parser.add_argument("--cases", default=",".join(CASES), help="comma separated cases to run")
+    parser.add_argument("--warm", action="store_true", help="keep result caches between calls")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="fraction a case may slow down by before it is flagged (default 0.1)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(tuple(args.cases.split(",")), args.seed, args.ops, args.warm)
+    baseline = None
+    regressions = []
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.threshold)
+    print_report(report, baseline, tuple(regressions))
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(report, file, indent=2)
+    if regressions:
+        print(f"{len(regressions)} case(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
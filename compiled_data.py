@@ -0,0 +1,228 @@
+"""compile the csv data files into a binary format that loads without parsing
+
+    python compiled_data.py                      # compiles pokemon_data.csv and chart.csv
+    python compiled_data.py other_pokemon.csv    # a dex with the same columns
+
+A compiled file holds one table of fixed-width numbers plus a string table, behind a versioned
+header that records which csv it was built from. The table is mapped from the file with
+np.memmap, so no text is parsed and processes using the same file share its pages. load_pokedex,
+get_pokemon_table and read_effectiveness use the compiled file when it is current and fall back
+to the csv when it is missing, from another format version, or older than the csv.
+"""
+import csv
+import hashlib
+import os
+import struct
+import sys
+from typing import Optional
+
+import numpy as np
+
+from pokemon_class import PokemonTable
+
+FORMAT_VERSION = 1
+MAGIC = b"PKBODATA"
+# magic, version, typecode, rows, cols, data offset, strings offset, strings length,
+# source size, source mtime_ns, source sha256
+HEADER = struct.Struct("<8sI4sIIQQQQq32s")
+COMPILED_DIR = "compiled"
+# the numpy dtype of each typecode write_compiled packs with
+DTYPES = {"i": "<i4", "d": "<f8"}
+
+
+def compiled_path(source: str) -> str:
+    """Return the path of the compiled form of the csv file source"""
+    directory, name = os.path.split(os.path.realpath(source))
+    return os.path.join(directory, COMPILED_DIR, os.path.splitext(name)[0] + ".bin")
+
+
+def _sha256(path: str) -> bytes:
+    """Return the sha256 digest of the file at path"""
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).digest()
+
+
+class CompiledTable:
+    """
+    The contents of a compiled file, with the table mapped from the file instead of read.
+
+    The mapping is shared with every other process that maps the same file, so worker processes
+    do not each hold a copy of the table, and it stays open as long as values or a view of it is alive.
+
+    Instance Attributes:
+        - rows: the number of rows in the table
+        - cols: the number of columns in the table
+        - values: the table as a read-only rows x cols array (ints or floats depending on the file)
+        - strings: the string table that int columns may index into
+    """
+    rows: int
+    cols: int
+    values: np.ndarray
+    strings: list[str]
+
+    def __init__(self, path: str, fields: tuple, text: bytes) -> None:
+        _, _, typecode, self.rows, self.cols, data_offset, *_ = fields
+        dtype = DTYPES[typecode.rstrip(b"\0").decode()]
+        if self.rows and self.cols:
+            self.values = np.memmap(path, dtype=dtype, mode="r", offset=data_offset, shape=(self.rows, self.cols))
+        else:
+            self.values = np.empty((self.rows, self.cols), dtype=dtype)
+        self.strings = text.decode().split("\n") if text else []
+
+
+def write_compiled(source: str, typecode: str, table: list[list], strings: list[str]) -> str:
+    """Write table (every value fitting typecode, 'i' or 'd') and strings as the compiled form of source
+
+    Returns the path written.
+    """
+    path = compiled_path(source)
+    stat = os.stat(source)
+    cols = len(table[0]) if table else 0
+    data = struct.pack(f"<{len(table) * cols}{typecode}", *(value for row in table for value in row))
+    text = "\n".join(strings).encode()
+    data_offset = -(-HEADER.size // 8) * 8  # 8 byte aligned so the table can be mapped in place
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, typecode.encode(), len(table), cols, data_offset,
+                         data_offset + len(data), len(text), stat.st_size, stat.st_mtime_ns, _sha256(source))
+    _write_file(path, header.ljust(data_offset, b"\0") + data + text)
+    return path
+
+
+def _write_file(path: str, content: bytes) -> None:
+    """Write content to path under a temporary name and rename it, so readers never see half a file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(content)
+    os.replace(temp_path, path)
+
+
+def open_compiled(source: str) -> Optional[CompiledTable]:
+    """Return the compiled form of source, or None if it is missing, from another version or out of date
+
+    A compiled file is current if source has the size and modification time it was built from, or
+    failing that (for instance after a fresh checkout) the same contents. Only the header and the
+    string table are read; the table is mapped. Reading never writes: restamp records a new
+    modification time, so that the contents are not hashed on every load.
+    """
+    path = compiled_path(source)
+    try:
+        stat = os.stat(source)
+        with open(path, "rb") as file:
+            fields = HEADER.unpack(file.read(HEADER.size))
+            file.seek(fields[6])
+            text = file.read(fields[7])
+        file_size = os.path.getsize(path)
+    except (OSError, struct.error):
+        return None
+    if not _is_current(fields, stat, source) or len(text) != fields[7]:
+        return None
+    typecode, rows, cols, data_offset = fields[2].rstrip(b"\0").decode(), fields[3], fields[4], fields[5]
+    if typecode not in DTYPES or data_offset + rows * cols * np.dtype(DTYPES[typecode]).itemsize > file_size:
+        return None
+    try:
+        return CompiledTable(path, fields, text)
+    except (OSError, ValueError):
+        return None
+
+
+def _is_current(fields: tuple, stat: os.stat_result, source: str) -> bool:
+    """Return whether the header fields describe a compiled file of this version built from source as it is"""
+    magic, version, *_, size, mtime_ns, digest = fields
+    if magic != MAGIC or version != FORMAT_VERSION or size != stat.st_size:
+        return False
+    return mtime_ns == stat.st_mtime_ns or digest == _sha256(source)
+
+
+def restamp(source: str) -> Optional[str]:
+    """Record the modification time of source in its compiled file, if source still has the contents it was built from
+
+    Returns the path of the compiled file, or None if source has to be compiled again.
+    """
+    path = compiled_path(source)
+    try:
+        stat = os.stat(source)
+        with open(path, "rb") as file:
+            content = file.read()
+        fields = HEADER.unpack_from(content)
+    except (OSError, struct.error):
+        return None
+    if not _is_current(fields, stat, source):
+        return None
+    if fields[-2] != stat.st_mtime_ns:
+        _write_file(path, HEADER.pack(*fields[:-2], stat.st_mtime_ns, fields[-1]) + content[HEADER.size:])
+    return path
+
+
+def compile_pokedex(source: str = "pokemon_data.csv") -> str:
+    """Compile a Pokemon data csv: ids and stats as ints, names and types as indices into the string table"""
+    strings = [""]
+    string_index = {"": 0}
+    table = []
+    with open(source) as file:
+        reader = csv.reader(file)
+        next(reader)  # skip header row
+        for row in reader:
+            if not row:
+                continue
+            texts = []
+            for text in row[1:4]:
+                if text not in string_index:
+                    string_index[text] = len(strings)
+                    strings.append(text)
+                texts.append(string_index[text])
+            table.append([int(row[0])] + texts + [int(value) for value in row[4:10]])
+    return write_compiled(source, "i", table, strings)
+
+
+def load_pokedex_rows(source: str) -> Optional[list[list]]:
+    """Return the rows of a Pokemon data csv as process_row makes them, from its compiled form if current"""
+    compiled = open_compiled(source)
+    if compiled is None:
+        return None
+    strings = compiled.strings
+    return [[row[0], strings[row[1]], strings[row[2]], strings[row[3]]] + row[4:] for row in compiled.values.tolist()]
+
+
+def load_pokemon_table(source: str) -> Optional[PokemonTable]:
+    """Return the PokemonTable of a Pokemon data csv from its compiled form if current
+
+    The id and stat columns are views of the mapped table. The type columns are renumbered the way
+    PokemonTable numbers them: by first appearance, with -1 for no second type.
+    """
+    compiled = open_compiled(source)
+    if compiled is None:
+        return None
+    values, strings = compiled.values, compiled.strings
+    type_strings = [index for index in dict.fromkeys(values[:, 2:4].ravel().tolist()) if strings[index]]
+    codes = np.full(len(strings), -1, dtype=np.int16)
+    codes[type_strings] = np.arange(len(type_strings))
+    return PokemonTable.from_columns(values[:, 0], [strings[index] for index in values[:, 1].tolist()],
+                                     [strings[index] for index in type_strings], codes[values[:, 2]],
+                                     codes[values[:, 3]], values[:, 4:10])
+
+
+def compile_chart(source: str = "chart.csv") -> str:
+    """Compile a type chart csv: the multipliers as doubles and the type names as the string table"""
+    from pokemon_type_data_scraper import read_csv_effectiveness  # pylint: disable=import-outside-toplevel
+    types, effectiveness = read_csv_effectiveness(source)
+    return write_compiled(source, "d", effectiveness, types)
+
+
+def load_chart(source: str) -> Optional[tuple[list[str], np.ndarray]]:
+    """Return the types and multipliers of a type chart csv from its compiled form if current
+
+    The multipliers are the mapped table itself, which TypeMatrix uses as its chart without a copy.
+    """
+    compiled = open_compiled(source)
+    if compiled is None:
+        return None
+    return list(compiled.strings), compiled.values
+
+
+if __name__ == "__main__":
+    sources = sys.argv[1:] or ["pokemon_data.csv", "chart.csv"]
+    for source_path in sources:
+        with open(source_path) as source_file:
+            is_chart = source_file.readline().startswith("Attacking")
+        # a csv with unchanged contents (e.g. after a fresh checkout) only needs its new modification time
+        print(restamp(source_path) or (compile_chart(source_path) if is_chart else compile_pokedex(source_path)))
@@ -0,0 +1,74 @@
+"""pytest fixtures shared by the test files: a local HTTP server standing in for the sprite site
+
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from sprite_loader import SpriteCache, SpriteFetcher
+
+ADD_ONS = ("first/", "second/", "third/")
+
+
+class SpriteHandler(BaseHTTPRequestHandler):
+    """Answers with the server's response for the path and records every path requested"""
+    server: 'SpriteServer'
+
+    def do_GET(self) -> None:
+        """Answer with the status and body set for the path after its delay, or 404"""
+        with self.server.lock:
+            self.server.requested.append(self.path)
+        status, content, delay = self.server.responses.get(self.path, (404, b"", 0.0))
+        time.sleep(delay)
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args) -> None:  # pylint: disable=redefined-builtin
+        """Keep the test output quiet"""
+
+
+class SpriteServer(ThreadingHTTPServer):
+    """
+    A loopback server serving sprites under /sprites/.
+
+    Instance Attributes:
+        - requested: every path requested, in order of arrival
+        - responses: a dictionary mapping a path to its status, body and delay in seconds
+    """
+    daemon_threads = True
+    requested: list[str]
+    responses: dict[str, tuple[int, bytes, float]]
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.requested = []
+        self.responses = {}
+        super().__init__(("127.0.0.1", 0), SpriteHandler)
+
+    def serve(self, add_on: str, name: str, content: bytes, status: int = 200, delay: float = 0.0) -> None:
+        """Answer requests for one variant of a sprite with content"""
+        self.responses[f"/sprites/{add_on}{name}.png"] = (status, content, delay)
+
+    def handle_error(self, request, client_address) -> None:
+        """Ignore clients that gave up on a slow response"""
+
+    def fetcher(self, cache: SpriteCache, timeout: float = 10.0) -> SpriteFetcher:
+        """Return a fetcher pointed at this server"""
+        host, port = self.server_address
+        return SpriteFetcher(base_url=f"http://{host}:{port}/sprites/", add_ons=ADD_ONS, timeout=timeout,
+                             cache=cache)
+
+
+@pytest.fixture
+def server():
+    """Run a SpriteServer for the duration of a test"""
+    sprite_server = SpriteServer()
+    thread = threading.Thread(target=sprite_server.serve_forever, daemon=True)
+    thread.start()
+    yield sprite_server
+    sprite_server.shutdown()
+    sprite_server.server_close()
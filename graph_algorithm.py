@@ -1,36 +1,73 @@
 """algorithm to create the type graph
 
 """
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+import numpy as np
+import instrumentation
 import pokemon_class
 from pokemon_type_data_scraper import read_effectiveness
+from result_cache import FileCache, LRUCache, file_stamp
 
+# canonical enemy team -> ranked candidates, see recommend_top_types
+RECOMMENDATION_CACHE = LRUCache(maxsize=4096)
 
+
+@instrumentation.timed
 def graph_builder(file_path):
     """return the type graph
     """
     types, effectiveness = read_effectiveness(file_path)
-    type_indices = {type_name: idx for idx, type_name in enumerate(types)}
-    graph = pokemon_class.TypeGraph()
-    for p_type in types:
-        graph.add_vertex(p_type)
-    for po_type in types:
-        for pok_type in types:
-            graph.add_attacking_edge(po_type, pok_type, effectiveness[type_indices[po_type]][type_indices[pok_type]])
+    graph = pokemon_class.TypeGraph.from_chart(types, effectiveness)
+    graph.matrix = pokemon_class.TypeMatrix(types, effectiveness)
     return graph
 
 
+# resolved chart path -> the graph of its current version, shared by every caller in the process
+CHART_CACHE = FileCache(graph_builder, 'chart cache')
+
+
+def cached_graph_builder(file_path, stamp=None):
+    """return the type graph for file_path, reusing the one already built unless the file has changed
+
+    stamp is the file_stamp of file_path, if the caller already has it. The returned graph is shared,
+    so callers must not modify it.
+    """
+    return CHART_CACHE.get(file_path, stamp)
+
+
+def cached_matrix_builder(file_path):
+    """return the compiled matrix of the cached type graph for file_path
+    """
+    return cached_graph_builder(file_path).matrix
+
+
+def chart_cache_info():
+    """return the hit and miss counts and the number of charts currently cached
+    """
+    return CHART_CACHE.info()
+
+
+def clear_chart_cache():
+    """drop every cached chart and reset the hit and miss counts
+    """
+    CHART_CACHE.clear()
+
+
 def get_effectiveness(graph, attacker, defender):
     """return the effectieve wieght of types
     """
+    if instrumentation.ACTIVE:
+        instrumentation.count('edge lookups')
+    if graph.matrix is not None:
+        return graph.matrix.effectiveness(attacker, defender)
     if isinstance(defender, tuple):
         eff1 = get_effectiveness(graph, attacker, defender[0])
         eff2 = get_effectiveness(graph, attacker, defender[1])
         return eff1 * eff2
     else:
-        vertex = graph.vertices[attacker]
-        for weight, neighbors in vertex.outgoing_neighbors.items():
-            if defender in {v.item for v in neighbors}:
-                return weight
+        return graph.edge_weight(attacker, defender)
 
 
 def get_overall_effectiveness(graph, recommended_types, enemy_types):
@@ -41,50 +78,49 @@ def get_overall_effectiveness(graph, recommended_types, enemy_types):
         return max(get_effectiveness(graph, r, enemy_types) for r in recommended_types)
 
 
-def strong_weak(chosen_pokemons):
+def team_coverage(matrix, team):
+    """return the strong and weak counts of the given team as arrays indexed like matrix.types
+
+    A team member is strong against a type it hits super effectively or resists, and weak against a
+    type it cannot hit well or that hits it super effectively. The members' bitmasks are unpacked into
+    a members x columns x types array of bits, which is summed over the members and then added up per
+    strong and weak column.
+    """
+    masks = matrix.masks[[matrix.typing_row(member) for member in team]]
+    counts = ((masks[:, :, None] >> np.arange(len(matrix.types))) & 1).sum(axis=0)
+    strong = counts[pokemon_class.HITS_SUPER_EFFECTIVE] + counts[pokemon_class.RESISTS]
+    weak = counts[pokemon_class.HITS_NOT_VERY_EFFECTIVE] + counts[pokemon_class.WEAK_TO]
+    return strong, weak
+
+
+def final_type_mask(matrix, team):
+    """return the bitmask of the types dict_subtraction would keep for the team's strong and weak counts
+
+    matrix.mask_types(final_type_mask(matrix, team)) lists them in chart order, like the keys of the
+    final dict.
+    """
+    return coverage_mask(*team_coverage(matrix, team))
+
+
+def coverage_mask(strong, weak):
+    """return the bitmask of the types whose weak count is higher than their strong count
+    """
+    return int(((weak > strong).astype(np.int64) << np.arange(len(weak))).sum())
+
+
+def strong_weak(chosen_pokemons, file_path='chart.csv'):
     """return the strong and weak dictionary of the given team
      """
-    strong = {}
-    weak = {}
-    graph = graph_builder(file_path='chart.csv')
-    all_types = list(graph.vertices.keys())
-
-    for chosen_pokemon in chosen_pokemons:
-        if isinstance(chosen_pokemon, tuple):
-            for pok_type in all_types:
-                max_eff = max(get_effectiveness(graph, chosen_pokemon[0], pok_type),
-                              get_effectiveness(graph, chosen_pokemon[1], pok_type))
-                if max_eff == 2.0:
-                    strong[pok_type] = strong.get(pok_type, 0) + 1
-                elif max_eff in (0.5, 0.0):
-                    weak[pok_type] = weak.get(pok_type, 0) + 1
-
-            for pok_type in all_types:
-                combined_eff = get_effectiveness(graph, pok_type, chosen_pokemon)
-                if combined_eff > 1.0:
-                    weak[pok_type] = weak.get(pok_type, 0) + 1
-                elif combined_eff < 1.0:
-                    strong[pok_type] = strong.get(pok_type, 0) + 1
-        else:
-            pokemon_vertex = graph.vertices[chosen_pokemon]
-            for out in pokemon_vertex.outgoing_neighbors:
-                if out == 2.0:
-                    for pokemon in pokemon_vertex.outgoing_neighbors[out]:
-                        poke = pokemon.item
-                        strong[poke] = strong.get(poke, 0) + 1
-                elif out in (0.5, 0.0):
-                    for pokemon in pokemon_vertex.outgoing_neighbors[out]:
-                        poke = pokemon.item
-                        weak[poke] = weak.get(poke, 0) + 1
-            for inc in pokemon_vertex.incoming_neighbors:
-                if inc == 2.0:
-                    for pokemon in pokemon_vertex.incoming_neighbors[inc]:
-                        poke = pokemon.item
-                        weak[poke] = weak.get(poke, 0) + 1
-                elif inc in (0.5, 0.0):
-                    for pokemon in pokemon_vertex.incoming_neighbors[inc]:
-                        poke = pokemon.item
-                        strong[poke] = strong.get(poke, 0) + 1
+    return coverage_dicts(cached_matrix_builder(file_path), chosen_pokemons)
+
+
+@instrumentation.timed(name='strong_weak')
+def coverage_dicts(matrix, chosen_pokemons):
+    """return the strong and weak dictionary of the given team against the chart of matrix
+    """
+    strong_counts, weak_counts = team_coverage(matrix, chosen_pokemons)
+    strong = {matrix.types[i]: int(count) for i, count in enumerate(strong_counts) if count}
+    weak = {matrix.types[i]: int(count) for i, count in enumerate(weak_counts) if count}
     return strong, weak
 
 
@@ -102,30 +138,121 @@ def dict_subtraction(strong, weak):
     return final_dict
 
 
+class TeamAnalyzer:
+    """
+    The running analysis of an enemy team that changes one member at a time.
+
+    Every typing contributes a fixed row to the strong and weak counts and to the score of every
+    candidate, so replacing a member subtracts its old rows and adds its new ones instead of running
+    strong_weak and score_candidate over the whole team again. For teams of typings in
+    matrix.typing_index, strong_weak, final_dict and rank agree with strong_weak, dict_subtraction and
+    rank_candidates.
+
+    Instance Attributes:
+        - matrix: the type chart the team is analysed with
+        - slots: the typing in each team slot, or None for an empty slot
+        - strong: the strong count of every type, indexed like matrix.types
+        - weak: the weak count of every type, indexed like matrix.types
+        - scores: the score_candidate score of every typing against the team, indexed like matrix.typings
+    """
+
+    def __init__(self, matrix, size=6):
+        self.matrix = matrix
+        self.slots = [None] * size
+        n = len(matrix.types)
+        self._strong_rows = (matrix.offense[:, :n] > 1.0).astype(np.int64) + (matrix.defense < 1.0)
+        self._weak_rows = (matrix.offense[:, :n] < 1.0).astype(np.int64) + (matrix.defense > 1.0)
+        # row e holds what facing enemy typing e adds to the score of every candidate
+        self._score_rows = np.ascontiguousarray(candidate_score_table(matrix).T)
+        self.strong = np.zeros(n, dtype=np.int64)
+        self.weak = np.zeros(n, dtype=np.int64)
+        self.scores = np.zeros(len(matrix.typings))
+
+    def set_member(self, slot, typing):
+        """put typing in slot (None empties it), updating the counts and scores by the difference"""
+        old = self.slots[slot]
+        if old == typing:
+            return
+        if old is not None:
+            self._apply(self.matrix.typing_row(old), -1)
+        if typing is not None:
+            self._apply(self.matrix.typing_row(typing), 1)
+        self.slots[slot] = typing
+
+    def _apply(self, row, sign):
+        """add (sign 1) or remove (sign -1) the contribution of the typing at row"""
+        self.strong += sign * self._strong_rows[row]
+        self.weak += sign * self._weak_rows[row]
+        self.scores += sign * self._score_rows[row]
+
+    def team(self):
+        """return the typings in the filled slots, in slot order"""
+        return [typing for typing in self.slots if typing is not None]
+
+    def strong_weak(self):
+        """return the strong and weak dictionaries of the team, as strong_weak does"""
+        types = self.matrix.types
+        return ({types[i]: int(self.strong[i]) for i in np.flatnonzero(self.strong)},
+                {types[i]: int(self.weak[i]) for i in np.flatnonzero(self.weak)})
+
+    def final_mask(self):
+        """return the bitmask of the types the team is weak to on balance, as final_type_mask does"""
+        return coverage_mask(self.strong, self.weak)
+
+    def final_dict(self):
+        """return the types the team is weak to on balance, as dict_subtraction does"""
+        return {type_name: int(self.weak[self.matrix.index[type_name]] - self.strong[self.matrix.index[type_name]])
+                for type_name in self.matrix.mask_types(self.final_mask())}
+
+    def rank(self, top_x=None):
+        """return the recommended types for the team, best first, and whether they cover it, as rank_candidates does
+        """
+        team_size = len(self.team())
+        if top_x is None:
+            top_x = team_size
+        types = self.matrix.mask_types(self.final_mask()) or self.matrix.types
+        candidates = types + [(types[i], types[j]) for i in range(len(types)) for j in range(i + 1, len(types))]
+        rows = [self.matrix.typing_index[cand] for cand in candidates]
+        order = np.argsort(-self.scores[rows], kind='stable')
+        covers_team = len(candidates) >= team_size
+        if covers_team:
+            order = order[:top_x]
+        return tuple(candidates[i] for i in order), covers_team
+
+
 def get_attacking_effectiveness(graph, attacker, defender):
     """Get effectiveness of attacker against defender from the graph."""
-    vertex = graph.vertices[attacker]
-    for weight, neighbors in vertex.outgoing_neighbors.items():
-        if defender in {v.item for v in neighbors}:
-            return weight
-    return 1.0
+    if instrumentation.ACTIVE:
+        instrumentation.count('edge lookups')
+    if graph.matrix is not None and defender in graph.matrix.index:
+        return graph.matrix.weight(attacker, defender)
+    weight = graph.edge_weight(attacker, defender)
+    return 1.0 if weight is None else weight
 
 
 def get_defense_effectiveness(graph, attack_type, defend_types):
     """Get effectiveness of attack_type against defend_types (product for dual types)."""
+    if instrumentation.ACTIVE:
+        instrumentation.count('edge lookups')
     multiplier = 1.0
     if isinstance(defend_types, str):
         defend_types = (defend_types,)
+    if graph.matrix is not None:
+        # a dual type attack_type never matches a single incoming edge, so it stays neutral
+        if attack_type not in graph.matrix.index:
+            return multiplier
+        return graph.matrix.effectiveness(attack_type, tuple(defend_types))
     for defend_type in defend_types:
-        for weight, vertices in graph.vertices[defend_type].incoming_neighbors.items():
-            if attack_type in {v.item for v in vertices}:
-                multiplier *= weight
-                break
+        weight = graph.edge_weight(attack_type, defend_type)
+        if weight is not None:
+            multiplier *= weight
     return multiplier
 
 
 def score_candidate(graph, candidate_types, enem_team):
     """Score a candidate type against the enemy team."""
+    if instrumentation.ACTIVE:
+        instrumentation.count('candidates scored')
     score = 0
     for enemy in enem_team:
         if isinstance(candidate_types, str):
@@ -177,60 +304,308 @@ def score_assigner(final_dict, enemy_types, graph):
     return temp
 
 
-def recommend_top_types(enemy_team, file_path='chart.csv', top_x=None):
-    """Recommend the top X types against the enemy team."""
+@instrumentation.timed
+def recommend_top_types(enemy_team, file_path='chart.csv', top_x=None, assignment='greedy'):
+    """Recommend the top X types against the enemy team.
+
+    With assignment='greedy' the best ranked candidates each take the enemy they hit hardest, in turn.
+    With assignment='optimal' the pairing comes from recommend_optimal_types and top_x is ignored.
+
+    The ranked candidates only depend on which typings the team holds, not on their order, so they are
+    cached under a canonical form of the team. Pairing candidates with enemies is redone in the
+    caller's order, which keeps the result identical to an uncached call.
+
+    Raises ValueError if assignment is neither 'greedy' nor 'optimal'.
+    """
+    if assignment == 'optimal':
+        return recommend_optimal_types(enemy_team, file_path)
+    if assignment != 'greedy':
+        raise ValueError(f"assignment must be 'greedy' or 'optimal', not {assignment!r}")
     if top_x is None:
         top_x = len(enemy_team)
 
-    graph = graph_builder(file_path)
+    stamp = file_stamp(file_path)
+    graph = cached_graph_builder(file_path, stamp)
 
-    strong, weak = strong_weak(enemy_team)
-    final_dict = dict_subtraction(strong, weak)
+    key = canonical_team_key(graph.matrix, enemy_team, stamp, top_x)
+    ranked = RECOMMENDATION_CACHE.get(key) if key is not None else None
+    instrumentation.count('recommendation cache hits' if ranked is not None else 'recommendation cache misses')
+    if ranked is None:
+        ranked = rank_candidates(graph, enemy_team, top_x)
+        if key is not None:
+            RECOMMENDATION_CACHE.put(key, ranked)
+    rec_types, covers_team = ranked
 
-    if not final_dict:
-        types = list(graph.vertices.keys())
-    else:
-        types = list(final_dict.keys())
+    enemy_team_copy = list(enemy_team[:])
+    results = []
+
+    for rec_type in rec_types:
+        effectivenesses = [get_overall_effectiveness(graph, rec_type, enemy) for enemy in enemy_team_copy]
+        max_eff = max(effectivenesses)
+        target_index = effectivenesses.index(max_eff)
+        target_enemy = enemy_team_copy.pop(target_index)
+        results.append([rec_type, target_enemy])
+
+    if not covers_team and enemy_team_copy:
+        results.extend(recommend_top_types(enemy_team_copy, file_path=file_path, top_x=len(enemy_team_copy)))
+
+    results_dict = {enemy: rec for rec, enemy in results}
+    ordered_results = [(results_dict[enemy], enemy) for enemy in enemy_team]
+
+    return ordered_results
+
+
+@instrumentation.timed
+def rank_candidates(graph, enemy_team, top_x):
+    """return the recommended types to hand out, best first, and whether there are enough to cover the team
+
+    When there are fewer candidates than enemies every candidate is returned, and recommend_top_types
+    recurses on the enemies left over.
+    """
+    types = graph.matrix.mask_types(final_type_mask(graph.matrix, enemy_team)) or list(graph.items)
 
-    # types = list(final_dict.keys())
     single_types = [(t,) for t in types]
     dual_types = [(types[i], types[j]) for i in range(len(types)) for j in range(i + 1, len(types))]
     candidates = single_types + dual_types
-    scores = {}
-    for cand in candidates:
-        scores[cand] = score_candidate(graph, cand, enemy_team)
+    covers_team = len(candidates) >= len(enemy_team)
+
+    matrix = graph.matrix
+    if matrix is not None and all(enemy in matrix.typing_index for enemy in enemy_team):
+        scores = candidate_scores(matrix, candidates, enemy_team)
+        order = range(len(candidates))
+        if covers_team and top_x >= 0:
+            # nlargest keeps a heap of top_x and ranks ties by position, exactly like the sorted slice below
+            order = heapq.nlargest(top_x, order, key=scores.__getitem__)
+        else:
+            order = sorted(order, key=scores.__getitem__, reverse=True)[:top_x if covers_team else None]
+        sorted_candidates = [candidates[i] for i in order]
+    else:
+        scores = {}
+        for cand in candidates:
+            scores[cand] = score_candidate(graph, cand, enemy_team)
+        sorted_candidates = [cand for cand, score in sorted(scores.items(), key=lambda x: x[1], reverse=True)]
+        if covers_team:
+            sorted_candidates = sorted_candidates[:top_x]
+    return tuple(cand[0] if len(cand) == 1 else cand for cand in sorted_candidates), covers_team
 
-    sorted_candidates = sorted(scores.items(), key=lambda x: x[1], reverse=True)
 
-    enemy_team_copy = list(enemy_team[:])
-    results = []
+def candidate_scores(matrix, candidates, enemy_team):
+    """return score_candidate(graph, cand, enemy_team) for every candidate, from the rows of cached_score_table
 
-    if len(sorted_candidates) >= len(enemy_team_copy):
-        top_candidates = sorted_candidates[:top_x]
+    Every enemy in enemy_team must be in matrix.typing_index.
+    """
+    if instrumentation.ACTIVE:
+        instrumentation.count('candidates scored', len(candidates))
+    table = cached_score_table(matrix)
+    columns = [matrix.typing_index[enemy] for enemy in enemy_team]
+    rows = [table[matrix.typing_index[cand[0] if len(cand) == 1 else cand]] for cand in candidates]
+    return [sum(row[column] for column in columns) for row in rows]
 
-        for cand, score in top_candidates:
-            rec_type = cand[0] if len(cand) == 1 else cand
-            effectivenesses = [get_overall_effectiveness(graph, rec_type, enemy) for enemy in enemy_team_copy]
-            max_eff = max(effectivenesses)
-            target_index = effectivenesses.index(max_eff)
-            target_enemy = enemy_team_copy.pop(target_index)
-            results.append([rec_type, target_enemy])
-    else:
-        for cand, score in sorted_candidates:
-            rec_type = cand[0] if len(cand) == 1 else cand
-            effectivenesses = [get_overall_effectiveness(graph, rec_type, enemy) for enemy in enemy_team_copy]
-            max_eff = max(effectivenesses)
-            target_index = effectivenesses.index(max_eff)
-            target_enemy = enemy_team_copy.pop(target_index)
-            results.append([rec_type, target_enemy])
 
-        if enemy_team_copy:
-            results.extend(recommend_top_types(enemy_team_copy, file_path='chart.csv', top_x=len(enemy_team_copy)))
+@lru_cache(maxsize=8)
+def cached_score_table(matrix):
+    """return candidate_score_table(matrix) as nested lists, built once per chart"""
+    return candidate_score_table(matrix).tolist()
 
-    results_dict = {enemy: rec for rec, enemy in results}
-    ordered_results = [(results_dict[enemy], enemy) for enemy in enemy_team]
 
-    return ordered_results
+def candidate_count(enemy_team, file_path='chart.csv'):
+    """return how many candidate typings rank_candidates builds for enemy_team
+    """
+    matrix = cached_matrix_builder(file_path)
+    types = final_type_mask(matrix, enemy_team).bit_count() or len(matrix.types)
+    return types + types * (types - 1) // 2
+
+
+def canonical_team_key(matrix, enemy_team, stamp, top_x):
+    """return a cache key that is the same for every ordering of enemy_team, or None if it cannot be cached
+
+    stamp is the file_stamp of the chart matrix was built from. Dual typings are folded to their table
+    row, so ('Ground', 'Fighting') and ('Fighting', 'Ground') match.
+    """
+    if not all(enemy in matrix.typing_index for enemy in enemy_team):
+        return None
+    return stamp, top_x, tuple(sorted(matrix.typing_index[enemy] for enemy in enemy_team))
+
+
+def configure_recommendation_cache(maxsize=None, ttl=None):
+    """change the size limit and/or time to live (in seconds) of the recommendation cache
+    """
+    RECOMMENDATION_CACHE.configure(maxsize, ttl)
+
+
+def recommendation_cache_info():
+    """return the hit and miss counts, hit rate and size of the recommendation cache
+    """
+    return RECOMMENDATION_CACHE.info()
+
+
+@instrumentation.timed
+def recommend_optimal_types(enemy_team, file_path='chart.csv'):
+    """Recommend one type per enemy, pairing them so the total matchup score is as high as possible.
+
+    Every candidate recommend_top_types would consider is scored against every enemy once, and the
+    pairing is solved as an assignment problem instead of greedily with recursion on the leftovers.
+    Among equally good pairings, candidates that rank higher against the whole team are preferred.
+    When there are fewer candidates than enemies, every typing in the chart is considered instead,
+    which covers whatever the greedy recursion could have picked. A repeated dual type such as
+    ('Water', 'Water') is scored as its single type.
+    """
+    graph = cached_graph_builder(file_path)
+    matrix = graph.matrix
+    if not enemy_team:
+        return []
+
+    types = matrix.mask_types(final_type_mask(matrix, enemy_team)) or list(graph.items)
+    if len(types) + len(types) * (len(types) - 1) // 2 < len(enemy_team):
+        types = list(graph.items)
+    candidates = types + [(types[i], types[j]) for i in range(len(types)) for j in range(i + 1, len(types))]
+    cand_rows = [matrix.typing_index[cand] for cand in candidates]
+    enemy_rows = [matrix.typing_row(enemy) for enemy in enemy_team]
+    pair_scores = candidate_score_table(matrix)[np.ix_(cand_rows, enemy_rows)]
+
+    # the position of each candidate in recommend_top_types' ranking, used to break ties
+    rank = np.empty(len(candidates))
+    rank[np.argsort(-pair_scores.sum(axis=1), kind='stable')] = np.arange(len(candidates))
+    # scores are multiples of 0.25, so the tie breaker can never outweigh a real difference
+    tie_breaker = 0.2 / (len(enemy_team) * len(candidates))
+    columns = solve_assignment((-pair_scores.T + tie_breaker * rank).tolist())
+    return [(candidates[column], enemy) for column, enemy in zip(columns, enemy_team)]
+
+
+def solve_assignment(cost):
+    """return the column assigned to each row of cost so the total cost is as low as possible
+
+    The Hungarian algorithm with row and column potentials, O(rows^2 * columns).
+
+    Preconditions:
+        - len(cost) <= len(cost[0])
+    """
+    n = len(cost)
+    m = len(cost[0]) if cost else 0
+    row_potential = [0.0] * (n + 1)
+    col_potential = [0.0] * (m + 1)
+    owner = [0] * (m + 1)  # owner[j] is the 1-indexed row matched to column j, 0 if free
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        min_slack = [float('inf')] * (m + 1)
+        used = [False] * (m + 1)
+        while owner[j0] != 0:
+            used[j0] = True
+            i0 = owner[j0]
+            delta = float('inf')
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    slack = cost[i0 - 1][j - 1] - row_potential[i0] - col_potential[j]
+                    if slack < min_slack[j]:
+                        min_slack[j] = slack
+                        way[j] = j0
+                    if min_slack[j] < delta:
+                        delta = min_slack[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    row_potential[owner[j]] += delta
+                    col_potential[j] -= delta
+                else:
+                    min_slack[j] -= delta
+            j0 = j1
+        while j0:
+            owner[j0] = owner[way[j0]]
+            j0 = way[j0]
+    columns = [0] * n
+    for j in range(1, m + 1):
+        if owner[j]:
+            columns[owner[j] - 1] = j - 1
+    return columns
+
+
+def candidate_score_table(matrix):
+    """return the score_candidate contribution of every candidate typing against every enemy typing
+
+    table[c][e] is what score_candidate adds for candidate matrix.typings[c] facing enemy matrix.typings[e],
+    so the score against a team is a sum of columns. Like score_candidate, a dual type enemy is treated
+    as neutral when the candidate defends.
+    """
+    n = len(matrix.types)
+    def_vuln = np.ones_like(matrix.offense)
+    def_vuln[:, :n] = matrix.defense
+    return matrix.offense - def_vuln
+
+
+@instrumentation.timed
+def recommend_many(teams, file_path='chart.csv', top_x=None, workers=None, chunk_size=2000):
+    """Recommend the top types for every enemy team in teams, exactly as recommend_top_types would.
+
+    The chart is built once and every team is scored against every candidate typing in a single
+    array computation. With workers > 1, teams are split into chunks of chunk_size and scored in a
+    process pool, keeping the input order.
+    """
+    teams = list(teams)
+    if workers and workers > 1 and len(teams) > chunk_size:
+        chunks = [teams[i:i + chunk_size] for i in range(0, len(teams), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = []
+            for chunk_results in executor.map(partial(_recommend_batch, file_path=file_path, top_x=top_x), chunks):
+                results.extend(chunk_results)
+            return results
+    return _recommend_batch(teams, file_path, top_x)
+
+
+def _recommend_batch(teams, file_path, top_x):
+    """score and assign a batch of teams in this process"""
+    matrix = cached_matrix_builder(file_path)
+    n = len(matrix.types)
+    # teams containing typings the tables do not cover (e.g. ('Water', 'Water')) take the per-team path
+    batched = [i for i, team in enumerate(teams) if all(enemy in matrix.typing_index for enemy in team)]
+    counts = np.zeros((len(batched), len(matrix.typings)))
+    for row, i in enumerate(batched):
+        for enemy in teams[i]:
+            counts[row, matrix.typing_index[enemy]] += 1
+
+    strong_table = (matrix.offense[:, :n] > 1.0).astype(float) + (matrix.defense < 1.0)
+    weak_table = (matrix.offense[:, :n] < 1.0).astype(float) + (matrix.defense > 1.0)
+    strong = counts @ strong_table
+    weak = counts @ weak_table
+    scores = counts @ candidate_score_table(matrix).T
+
+    results = [None] * len(teams)
+    for row, i in enumerate(batched):
+        # dict_subtraction keeps a type when its weak count beats its strong count
+        types = [matrix.types[t] for t in np.flatnonzero(weak[row] > strong[row])] or matrix.types
+        results[i] = _assign_candidates(matrix, types, scores[row], teams[i], top_x, file_path)
+    for i, team in enumerate(teams):
+        if results[i] is None:
+            results[i] = recommend_top_types(team, file_path, top_x)
+    return results
+
+
+def _assign_candidates(matrix, types, team_scores, enemy_team, top_x, file_path='chart.csv'):
+    """rank the candidates built from types and pair them with enemies the way recommend_top_types does"""
+    if top_x is None:
+        top_x = len(enemy_team)
+    candidates = [(t,) for t in types] + [(types[i], types[j]) for i in range(len(types))
+                                            for j in range(i + 1, len(types))]
+    cand_rows = [matrix.typing_index[cand[0] if len(cand) == 1 else cand] for cand in candidates]
+    order = np.argsort(-team_scores[cand_rows], kind='stable')
+
+    enemy_team_copy = list(enemy_team[:])
+    enemy_rows = [matrix.typing_index[enemy] for enemy in enemy_team_copy]
+    results = []
+    chosen = order[:top_x] if len(candidates) >= len(enemy_team_copy) else order
+    for idx in chosen:
+        cand = candidates[idx]
+        effectivenesses = matrix.offense[cand_rows[idx], enemy_rows]
+        target_index = int(np.argmax(effectivenesses))
+        enemy_rows.pop(target_index)
+        results.append([cand[0] if len(cand) == 1 else cand, enemy_team_copy.pop(target_index)])
+    if len(candidates) < len(enemy_team) and enemy_team_copy:
+        results.extend(recommend_top_types(enemy_team_copy, file_path=file_path, top_x=len(enemy_team_copy)))
+
+    results_dict = {enemy: rec for rec, enemy in results}
+    return [(results_dict[enemy], enemy) for enemy in enemy_team]
 
 
 if __name__ == '__main__':
@@ -240,9 +615,10 @@ if __name__ == '__main__':
         'max-line-length': 120,
         'disable': ['E1136', 'W0221'],
         'max-nested-blocks': 4,
-        'allowed_modules': ['pygame', 'requests', 'pandas',
-                            'io', 'math', 'random', 'pokemon_data_scraper',
-                            'graph_algorithm', 'pokemon_final_team', 'pokemon_class', 'pokemon_type_data_scraper']
+        'allowed_modules': ['pygame', 'requests', 'pandas', 'numpy',
+                            'io', 'math', 'heapq', 'concurrent.futures', 'functools', 'result_cache',
+                            'instrumentation', 'random', 'pokemon_data_scraper', 'graph_algorithm',
+                            'pokemon_final_team', 'pokemon_class', 'pokemon_type_data_scraper']
     })
 
     results = recommend_top_types(
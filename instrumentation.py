@@ -0,0 +1,190 @@
+"""opt-in timers and counters for finding where a request spends its time
+
+Functions decorated with timed record how long they take, and count adds to named counters, but
+only inside a trace on the same thread:
+
+    with trace("team") as team_trace:
+        get_user_pokemon(...)
+    print(team_trace.report())
+    team_trace.write_folded("team.folded")  # flamegraph.pl / speedscope input
+
+Outside every trace, a timed function costs one global check per call and nothing is recorded.
+Hot loops guard count with `if instrumentation.ACTIVE:` so they skip even that call. profile runs
+a block under cProfile for a whole-program view.
+"""
+import cProfile
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+# the number of traces open in any thread; timed and count do nothing while it is 0
+ACTIVE = 0
+_ACTIVE_LOCK = threading.Lock()
+_LOCAL = threading.local()
+
+# set POKEMON_TRACE=1 to have the game and command line tools trace every request
+TRACE_REQUESTS = os.environ.get("POKEMON_TRACE", "") not in ("", "0")
+
+
+class Trace:
+    """
+    The stage timings and counters recorded during one request.
+
+    Instance Attributes:
+        - name: what was traced
+        - stages: for every stack of timed functions, the number of calls and the total seconds spent
+        - counters: the totals of every counter
+        - elapsed: the seconds the trace was open for
+    """
+    name: str
+    stages: dict[tuple[str, ...], list]
+    counters: dict[str, int]
+    elapsed: float
+    _stack: list[str]
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.stages = {}
+        self.counters = {}
+        self.elapsed = 0.0
+        self._stack = []
+
+    def enter(self, stage: str) -> None:
+        """Record that stage started inside the current one"""
+        self._stack.append(stage)
+
+    def exit(self, seconds: float) -> None:
+        """Record that the current stage finished after seconds"""
+        entry = self.stages.setdefault(tuple(self._stack), [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        self._stack.pop()
+
+    def self_time(self, path: tuple[str, ...]) -> float:
+        """Return the seconds spent in the stage at path itself, not in the timed stages it called"""
+        children = sum(total for other, (_, total) in self.stages.items()
+                       if len(other) == len(path) + 1 and other[:len(path)] == path)
+        return max(self.stages[path][1] - children, 0.0)
+
+    def summary(self) -> dict[str, Any]:
+        """Return the trace as plain data, with stages keyed by their stack joined with '/'"""
+        return {"name": self.name, "elapsed_ms": self.elapsed * 1000,
+                "stages": {"/".join(path): {"calls": calls, "total_ms": total * 1000,
+                                            "self_ms": self.self_time(path) * 1000}
+                           for path, (calls, total) in sorted(self.stages.items())},
+                "counters": dict(sorted(self.counters.items()))}
+
+    def report(self) -> str:
+        """Return a readable table of the stages, indented by depth, and the counters"""
+        lines = [f"trace {self.name}: {self.elapsed * 1000:.3f} ms"]
+        for path, (calls, total) in sorted(self.stages.items()):
+            label = "  " * len(path) + path[-1]
+            lines.append(f"{label:<40}{calls:>8} calls{total * 1000:>12.3f} ms"
+                         f"{self.self_time(path) * 1000:>12.3f} ms self")
+        for counter, value in sorted(self.counters.items()):
+            lines.append(f"  {counter:<38}{value:>8}")
+        return "\n".join(lines)
+
+    def folded(self) -> list[str]:
+        """Return the self time of every stack in microseconds, in the folded format flamegraph tools read"""
+        lines = []
+        untimed = self.elapsed - sum(total for path, (_, total) in self.stages.items() if len(path) == 1)
+        if untimed > 0:
+            lines.append(f"{self.name} {round(untimed * 1e6)}")
+        for path in sorted(self.stages):
+            lines.append(f"{';'.join((self.name,) + path)} {round(self.self_time(path) * 1e6)}")
+        return lines
+
+    def write_folded(self, path: str) -> None:
+        """Write folded() to path"""
+        with open(path, "w") as file:
+            file.write("\n".join(self.folded()) + "\n")
+
+
+def _open_traces() -> list[Trace]:
+    """Return the traces open in this thread, innermost last"""
+    traces = getattr(_LOCAL, "traces", None)
+    if traces is None:
+        traces = _LOCAL.traces = []
+    return traces
+
+
+@contextmanager
+def trace(name: str, enabled: bool = True) -> Iterator[Optional[Trace]]:
+    """Record timed stages and counters in this thread until the block ends
+
+    Traces may be nested, in which case every open trace records everything. If enabled is False
+    nothing is recorded and None is given to the block.
+    """
+    global ACTIVE
+    if not enabled:
+        yield None
+        return
+    new_trace = Trace(name)
+    traces = _open_traces()
+    traces.append(new_trace)
+    with _ACTIVE_LOCK:
+        ACTIVE += 1
+    start = time.perf_counter()
+    try:
+        yield new_trace
+    finally:
+        new_trace.elapsed = time.perf_counter() - start
+        traces.remove(new_trace)
+        with _ACTIVE_LOCK:
+            ACTIVE -= 1
+
+
+def timed(func: Optional[Callable] = None, *, name: Optional[str] = None) -> Callable:
+    """Decorate a function so each call is recorded as a stage of the open traces
+
+    The stage is called name, or the function's name. Use as @timed or @timed(name=...).
+    """
+    def decorate(function: Callable) -> Callable:
+        stage = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not ACTIVE:
+                return function(*args, **kwargs)
+            traces = list(_open_traces())
+            if not traces:
+                return function(*args, **kwargs)
+            for open_trace in traces:
+                open_trace.enter(stage)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                for open_trace in traces:
+                    open_trace.exit(seconds)
+        return wrapper
+
+    return decorate(func) if func is not None else decorate
+
+
+def count(counter: str, amount: int = 1) -> None:
+    """Add amount to counter in the open traces of this thread"""
+    if not ACTIVE:
+        return
+    for open_trace in _open_traces():
+        open_trace.counters[counter] = open_trace.counters.get(counter, 0) + amount
+
+
+@contextmanager
+def profile(path: str) -> Iterator[cProfile.Profile]:
+    """Run the block under cProfile and write the statistics to path
+
+    The file can be read with pstats, snakeviz, or converted to a flamegraph with flameprof.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
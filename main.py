@@ -1,25 +1,37 @@
 """Main file for the Pokémon Battle Matchup Optimizer."""
 import io
+import sys
 import random
 import math
-from typing import Optional, Dict, List, Tuple
+import importlib
+from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Iterable, Optional, Dict, List, Tuple
 import pygame
-import requests
-import pandas as pd
-from pokemon_data_scraper import convert_pokemon_to_id
-from pokemon_final_team import get_user_pokemon, get_pokemon
-from pokemon_class import Pokemon
+from pokemon_data_scraper import Pokedex, load_pokedex, convert_pokemon_to_id, complete_pokemon_name, \
+    format_pokemon_name
+from sprite_loader import SpriteFetcher, SpriteCache, ADD_ONS
+from instrumentation import trace, TRACE_REQUESTS
 
-pygame.init()
+if TYPE_CHECKING:
+    from graph_algorithm import TeamAnalyzer
 
 WIDTH, HEIGHT = 800, 600
-BLACK, WHITE, RED = (0, 0, 0), (255, 255, 255), (255, 0, 0)
+BLACK, WHITE, RED, GREY = (0, 0, 0), (255, 255, 255), (255, 0, 0), (150, 150, 150)
 ENEMY_TEAM_OFFSET, USER_TEAM_OFFSET = 250, 440
-FONT = pygame.font.SysFont("consolas", 20)
-BASE_URL = "https://img.pokemondb.net/sprites/"
-ADD_ONS = ("scarlet-violet/normal/1x/", "x-y/normal/", "sun-moon/normal/1x/", "sword-shield/normal/", "home/normal/1x/")
+FPS = 30  # the most frames drawn per second; idle screens are not redrawn at all
 
 START_SCREEN, INPUT_SCREEN, RESULT_SCREEN = range(3)
+RESULTS_READY = pygame.USEREVENT + 1  # posted by the worker thread when a team's matchups are computed
+PRELOADED = pygame.USEREVENT + 2  # posted once preload_matchups finishes, so the live preview can be drawn
+PREVIEW_X, PREVIEW_Y = WIDTH // 2 + 130, 250
+PREVIEW_LINES = 8  # the headings, three weak spots and three suggestions, see draw_preview
+# the six input boxes with their arrow and completion hints, up to where the preview starts
+INPUT_BOXES_RECT = pygame.Rect(WIDTH // 2 - 130, 240, 260, 185)
+PREVIEW_RECT = pygame.Rect(PREVIEW_X, PREVIEW_Y, WIDTH - PREVIEW_X, PREVIEW_LINES * 25)
+INPUT_RECT = INPUT_BOXES_RECT.union(PREVIEW_RECT)  # redrawn whenever the enemy team or the preview changes
+MESSAGE_RECT = pygame.Rect(0, HEIGHT - 130, WIDTH, 25)  # the error and computing messages
+PROGRESS_RECT = pygame.Rect(WIDTH // 2 - 110, HEIGHT - 130, 260, 25)
 
 
 class Game:
@@ -28,6 +40,7 @@ class Game:
     Instance Attributes:
         - screen: the game screen
         - background: the background image
+        - title_image: the scaled title image, loaded once
         - state: the current game state
         - enemy_team: the enemy team of Pokémon
         - user_team: the user team of Pokémon
@@ -35,13 +48,23 @@ class Game:
         - input_index: the current index for inputting Pokémon names
         - error_message: an error message to display
         - pokemon_sprites: a dictionary of Pokémon sprites
+        - sprite_fetcher: downloads sprites concurrently over a shared session
+        - worker: the background thread computing matchups and downloading sprites
+        - pending: the computation submitted to worker, if one is running
+        - request_id: increases with every computation started or cancelled, so stale results are ignored
+        - preloaded: the worker's preload_matchups call, which gives the team analyzer
+        - analyzer: the running analysis of the enemy team behind the live preview, once preloaded
         - start_button: the start button rectangle
         - enter_button: the enter button rectangle
         - random_button: the random button rectangle
         - back_button: the back button rectangle
+        - dirty: whether the whole screen must be redrawn, because the game state changed
+        - changed: the areas of the screen that changed since the last frame, redrawn on their own
+        - progress_frame: the frame of the computing animation currently on screen
     """
     screen: pygame.Surface
     background: pygame.Surface
+    title_image: pygame.Surface
     state: int
     enemy_team: list[str]
     user_team: list[str]
@@ -49,24 +72,39 @@ class Game:
     input_index: int
     error_message: Optional[str]
     pokemon_sprites: dict[str, pygame.Surface]
+    sprite_fetcher: SpriteFetcher
+    worker: ThreadPoolExecutor
+    pending: Optional[Future]
+    request_id: int
+    preloaded: Future
+    analyzer: Optional["TeamAnalyzer"]
     start_button: Optional[pygame.Rect]
     enter_button: Optional[pygame.Rect]
     random_button: Optional[pygame.Rect]
     back_button: Optional[pygame.Rect]
+    dirty: bool
+    changed: List[pygame.Rect]
+    progress_frame: int
 
     def __init__(self, screen: Optional[pygame.Surface] = None, background: Optional[pygame.Surface] = None,
                  state: int = START_SCREEN, enemy_team: Optional[List[str]] = None,
                  user_team: Optional[List[str]] = None, running: bool = True, input_index: int = 0,
                  error_message: Optional[str] = None, pokemon_sprites: Optional[Dict[str, pygame.Surface]] = None,
                  start_button: Optional[pygame.Rect] = None, enter_button: Optional[pygame.Rect] = None,
-                 random_button: Optional[pygame.Rect] = None, back_button: Optional[pygame.Rect] = None) -> None:
+                 random_button: Optional[pygame.Rect] = None, back_button: Optional[pygame.Rect] = None,
+                 sprite_fetcher: Optional[SpriteFetcher] = None) -> None:
+        pygame.init()
         pygame.display.set_caption("Pokémon Battle Matchup Optimizer")
 
         self.state = state
         self.screen = screen if screen else pygame.display.set_mode((WIDTH, HEIGHT))
         self.background = background if background else pygame.transform.scale(
             pygame.image.load("images/background2.png"), (WIDTH, HEIGHT)
-        )
+        ).convert()
+        title_image = pygame.image.load("images/title_text.png")
+        self.title_image = pygame.transform.scale(
+            title_image, (title_image.get_width() // 1.5, title_image.get_height() // 1.5)
+        ).convert_alpha()
         # Game state
         self.enemy_team = enemy_team if enemy_team else [""] * 6
         self.user_team = user_team if user_team else [""] * 6
@@ -74,44 +112,54 @@ class Game:
         self.input_index = input_index
         self.error_message = error_message
         self.pokemon_sprites = pokemon_sprites if pokemon_sprites else {}
+        self.sprite_fetcher = sprite_fetcher if sprite_fetcher else SpriteFetcher(cache=SpriteCache())
+        self.worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="matchups")
+        self.preloaded = self.worker.submit(preload_matchups)
+        self.preloaded.add_done_callback(lambda _: pygame.event.post(pygame.event.Event(PRELOADED)))
+        self.pending = None
+        self.request_id = 0
+        self.analyzer = None
 
         # UI elements
         self.start_button = start_button
         self.enter_button = enter_button
         self.random_button = random_button
         self.back_button = back_button
+        self.dirty = True
+        self.changed = []
+        self.progress_frame = -1
 
     def load_sprite(self, pokemon_name: str) -> Optional[pygame.Surface]:
         """Tries to load a Pokémon sprite from the web, handling variations in naming."""
-        if pokemon_name in self.pokemon_sprites:
-            return self.pokemon_sprites[pokemon_name]
-
-        formatted_name = (
-            pokemon_name.lower()
-            .replace(" ", "-")
-            .replace(".", "")
-            .replace("'", "")
-            .replace("♀", "-f")
-            .replace("♂", "-m")
-            .replace(": ", "-")
-            .replace("é", "e")
-        )
-
-        for url in ADD_ONS:
-            sprite = self.fetch_sprite(BASE_URL + url + formatted_name + ".png")
-            if sprite:
-                self.pokemon_sprites[pokemon_name] = sprite
-                return self.adjust_sprite(sprite, url)
-        return None
+        return self.load_sprites([pokemon_name])[pokemon_name]
+
+    def load_sprites(self, pokemon_names: list[str]) -> Dict[str, Optional[pygame.Surface]]:
+        """Loads the sprites of several Pokémon at once, fetching every url variant concurrently."""
+        missing = {format_pokemon_name(name) for name in pokemon_names if name not in self.pokemon_sprites}
+        return self.store_sprites(pokemon_names, self.sprite_fetcher.fetch_variants(list(missing)))
+
+    def store_sprites(self, pokemon_names: list[str],
+                      fetched: Dict[str, Optional[Tuple[str, bytes]]]) -> Dict[str, Optional[pygame.Surface]]:
+        """Decodes sprites returned by SpriteFetcher.fetch_variants into pokemon_sprites."""
+        for name in pokemon_names:
+            variant = fetched.get(format_pokemon_name(name))
+            if name not in self.pokemon_sprites and variant is not None:
+                url, content = variant
+                self.pokemon_sprites[name] = self.adjust_sprite(self.decode_sprite(content), url)
+        return {name: self.pokemon_sprites.get(name) for name in pokemon_names}
 
     def fetch_sprite(self, url: str) -> Optional[pygame.Surface]:
         """Helper function to fetch and scale a sprite from a given URL."""
-        response = requests.get(url, stream=True)
-        if response.status_code == 200:
-            sprite = pygame.image.load(io.BytesIO(response.content))
-            return pygame.transform.scale(sprite, (80, 80))
+        content = self.sprite_fetcher.fetch(url)
+        if content is not None:
+            return self.decode_sprite(content)
         return None
 
+    def decode_sprite(self, content: bytes) -> pygame.Surface:
+        """Decodes downloaded image bytes into a sprite scaled to size."""
+        sprite = pygame.image.load(io.BytesIO(content))
+        return pygame.transform.scale(sprite, (80, 80))
+
     def adjust_sprite(self, sprite: pygame.Surface, url: str) -> pygame.Surface:
         """Adjusts the sprite if needed based on the source URL."""
         if url == ADD_ONS[0]:
@@ -134,7 +182,7 @@ class Game:
         sprite = self.pokemon_sprites.get(pokemon_name)
         if sprite:
             self.screen.blit(sprite, (x - 40, y - 40))
-        pokemon_name_text = FONT.render(pokemon_name.capitalize(), True, BLACK)
+        pokemon_name_text = render_text(pokemon_name.capitalize(), BLACK)
         self.screen.blit(pokemon_name_text, (x - pokemon_name_text.get_width() // 2, y - 40))
 
     def draw_button(self, text: str, x_pos: int, y_pos: int, width: int, height: int) -> pygame.Rect:
@@ -142,7 +190,7 @@ class Game:
         rect = pygame.Rect(x_pos, y_pos, width, height)
         pygame.draw.rect(self.screen, WHITE, rect)
         pygame.draw.rect(self.screen, BLACK, rect, 2)
-        text_surface = FONT.render(text, True, BLACK)
+        text_surface = render_text(text, BLACK)
         self.screen.blit(text_surface, (x_pos + (width - text_surface.get_width()) // 2,
                                         y_pos + (height - text_surface.get_height()) // 2))
         return rect
@@ -156,31 +204,63 @@ class Game:
             pygame.draw.rect(self.screen, WHITE, box_rect)
             pygame.draw.rect(self.screen, BLACK, box_rect, 2)
 
-            text_surface = FONT.render(f"{i + 1}. {self.enemy_team[i]}", True, BLACK)
+            text_surface = render_text(f"{i + 1}. {self.enemy_team[i]}", BLACK)
             self.screen.blit(text_surface, (x, y))
 
             if i == self.input_index:
+                suggestion = self.get_completion(self.enemy_team[i])
+                if suggestion:
+                    hint_surface = render_text(suggestion[len(self.enemy_team[i]):], GREY)
+                    self.screen.blit(hint_surface, (x + text_surface.get_width(), y))
                 pygame.draw.polygon(self.screen, BLACK, [
                     (x - 15, y + 5),
                     (x - 20, y),
                     (x - 20, y + 10)
                 ])
+        self.draw_preview()
+
+    def draw_preview(self) -> None:
+        """Draws the types the enemy team so far is weak to and the best types to use against it."""
+        analyzer = self.team_analyzer()
+        if analyzer is None or not analyzer.team():
+            return
+        weak_spots = sorted(analyzer.final_dict().items(), key=lambda item: -item[1])[:3]
+        recommended, _ = analyzer.rank(3)
+        lines = ["Weak spots:"] + [f" {poke_type} x{count}" for poke_type, count in weak_spots] + \
+                ["Try:"] + [" " + (typing if isinstance(typing, str) else "/".join(typing)) for typing in recommended]
+        for i, line in enumerate(lines):
+            self.screen.blit(render_text(line, BLACK), (PREVIEW_X, PREVIEW_Y + i * 25))
+
+    def team_analyzer(self) -> Optional["TeamAnalyzer"]:
+        """Returns the team analyzer, filling it with the enemy team the first time it is ready."""
+        if self.analyzer is None and self.preloaded.done() and self.preloaded.exception() is None:
+            self.analyzer = self.preloaded.result()
+            self.update_preview(range(6))
+        return self.analyzer
+
+    def update_preview(self, slots: Iterable[int]) -> None:
+        """Updates the team analyzer with the Pokémon now in the given enemy team slots."""
+        if self.analyzer is None:
+            return
+        pokedex = load_pokedex("pokemon_data.csv")
+        for slot in slots:
+            row = pokedex.get_by_name(self.enemy_team[slot]) if self.enemy_team[slot].strip() else None
+            typing = None if row is None else (row[2] if not row[3] else (row[2], row[3]))
+            self.analyzer.set_member(slot, typing)
 
     def check_game_state(self) -> None:
         """Updates screen based on current game state."""
         if self.state == START_SCREEN:
             self.start_button = self.draw_button("Start", WIDTH // 2 - 50, HEIGHT // 2 + 125, 100, 50)
-            title_text = pygame.image.load("images/title_text.png")
-            title_text_sized = pygame.transform.scale(title_text,
-                                                      (title_text.get_width() // 1.5, title_text.get_height() // 1.5))
-            self.screen.blit(title_text_sized, (WIDTH // 7, HEIGHT // 3 + 50))
+            self.screen.blit(self.title_image, (WIDTH // 7, HEIGHT // 3 + 50))
 
         elif self.state == INPUT_SCREEN:
-            input_text = FONT.render("Enter the Pokémon on the enemy team:", True, BLACK)
+            input_text = render_text("Enter the Pokémon on the enemy team:", BLACK)
             self.screen.blit(input_text, (WIDTH // 2 - input_text.get_width() // 2, 200))
             self.draw_input_boxes()
             self.enter_button = self.draw_button("Enter Team", WIDTH // 2.3, HEIGHT - 100, 120, 50)
             self.draw_error_message()
+            self.draw_progress()
             self.random_button = self.draw_button("Randomize Team", WIDTH // 10, HEIGHT // 2 + 20, 160, 50)
 
         elif self.state == RESULT_SCREEN:
@@ -191,7 +271,7 @@ class Game:
         enemy_team_positions = self.get_team_positions(ENEMY_TEAM_OFFSET)
         user_team_positions = self.get_team_positions(USER_TEAM_OFFSET)
 
-        enemy_text = FONT.render("Enemy Team", True, BLACK)
+        enemy_text = render_text("Enemy Team", BLACK)
         self.screen.blit(enemy_text, (WIDTH // 2 - enemy_text.get_width() // 2, ENEMY_TEAM_OFFSET - 80))
 
         for i in range(6):
@@ -227,51 +307,151 @@ class Game:
         pygame.draw.polygon(self.screen, BLACK, [end, point1, point2])
 
     def handle_event(self, event: pygame.event.Event, mouse_position: Tuple[int, int]) -> None:
-        """Handles events."""
+        """Handles events, marking the parts of the screen they change."""
         if event.type == pygame.QUIT:
             self.running = False
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            self.dirty = True
+        elif event.type == RESULTS_READY:
+            self.show_results(event)
+        elif event.type == PRELOADED and self.state == INPUT_SCREEN:
+            self.mark_changed(INPUT_RECT)
         elif event.type == pygame.MOUSEBUTTONDOWN:
             if self.state == START_SCREEN and self.start_button.collidepoint(mouse_position):
                 self.state = INPUT_SCREEN
+                self.dirty = True
             elif self.state == INPUT_SCREEN and self.enter_button.collidepoint(mouse_position):
                 self.check_team()
+                self.mark_changed(MESSAGE_RECT)
             elif self.state == INPUT_SCREEN and self.random_button.collidepoint(mouse_position):
-                self.enemy_team = generate_random_team(pd.read_csv("pokemon_data.csv"))
-                self.pokemon_sprites = {name: self.load_sprite(name) for name in self.enemy_team}
+                self.cancel_computation()
+                self.enemy_team = generate_random_team(load_pokedex("pokemon_data.csv"))
                 self.error_message = None
                 self.input_index = 0
-                self.draw_input_boxes()
+                self.update_preview(range(6))
+                self.mark_changed(INPUT_RECT)
+                self.mark_changed(MESSAGE_RECT)
             elif self.state == RESULT_SCREEN and self.back_button.collidepoint(mouse_position):
+                self.cancel_computation()
                 self.enemy_team = [""] * 6
                 self.user_team = [""] * 6
-                self.pokemon_sprites.clear()
                 self.state = INPUT_SCREEN
+                self.update_preview(range(6))
+                self.dirty = True
         elif event.type == pygame.KEYDOWN and self.state == INPUT_SCREEN:
             self.enter_enemy_team(event)
 
+    def get_completion(self, text: str) -> Optional[str]:
+        """Returns the first Pokémon name completing the typed text, lowercased to match the input."""
+        if not text:
+            return None
+        matches = complete_pokemon_name(text, "pokemon_data.csv", 1)
+        if matches and matches[0].lower().startswith(text):
+            return matches[0].lower()
+        return None
+
     def check_team(self) -> None:
-        """Checks if inputted enemy team is valid."""
-        self.pokemon_sprites = {name: self.load_sprite(name) for name in set(self.enemy_team)}
-        invalid_names = [name for name in self.enemy_team if not self.pokemon_sprites.get(name)]
+        """Checks if inputted enemy team is valid, and if so starts computing the matchups in the background."""
+        enemy_team_to_id = [convert_pokemon_to_id(pkmn, "pokemon_data.csv") for pkmn in self.enemy_team]
+        invalid_names = [name for name, pkmn_id in zip(self.enemy_team, enemy_team_to_id) if pkmn_id is None]
 
         if invalid_names:
             self.error_message = "Invalid Pokémon names: " + ", ".join(invalid_names)
         else:
-            enemy_team_to_id = [convert_pokemon_to_id(pkmn, "pokemon_data.csv") for pkmn in self.enemy_team]
-            self.user_team, _ = get_user_pokemon(get_pokemon(enemy_team_to_id, "pokemon_data.csv"),
-                                                 "pokemon_data.csv", "chart.csv")
-            self.pokemon_sprites.update({name.lower(): self.load_sprite(name) for name in set(self.user_team)})
-            self.state = RESULT_SCREEN
             self.error_message = None
+            self.cancel_computation()
+            self.pending = self.worker.submit(self.compute_results, self.request_id, list(self.enemy_team),
+                                              enemy_team_to_id, set(self.pokemon_sprites))
+
+    def compute_results(self, request_id: int, enemy_team: List[str], enemy_team_to_id: List[int],
+                        loaded: set) -> None:
+        """Runs on the worker thread: finds the user team, downloads the sprites and posts RESULTS_READY.
+
+        With POKEMON_TRACE set, a summary of where the time went is printed to stderr.
+        """
+        with trace(", ".join(enemy_team), TRACE_REQUESTS) as request_trace:
+            self.find_matchups(request_id, enemy_team, enemy_team_to_id, loaded)
+        if request_trace is not None:
+            print(request_trace.report(), file=sys.stderr)
+
+    def find_matchups(self, request_id: int, enemy_team: List[str], enemy_team_to_id: List[int],
+                      loaded: set) -> None:
+        """Does the work of compute_results, giving up early once request_id is stale."""
+        from pokemon_final_team import get_user_pokemon, get_pokemon  # loaded by preload_matchups
+
+        try:
+            user_team, _ = get_user_pokemon(get_pokemon(enemy_team_to_id, "pokemon_data.csv"),
+                                            "pokemon_data.csv", "chart.csv", "optimal")
+            if request_id != self.request_id:
+                return
+            names = {format_pokemon_name(name) for name in enemy_team + user_team if name not in loaded}
+            fetched = self.sprite_fetcher.fetch_variants(list(names))
+            pygame.event.post(pygame.event.Event(RESULTS_READY, request_id=request_id, enemy_team=enemy_team,
+                                                 user_team=user_team, fetched=fetched, error=None))
+        except Exception as error:  # surface the failure in the UI instead of losing it in the thread
+            pygame.event.post(pygame.event.Event(RESULTS_READY, request_id=request_id, error=str(error)))
+
+    def show_results(self, event: pygame.event.Event) -> None:
+        """Switches to the results screen once the worker's RESULTS_READY event arrives, unless it is stale."""
+        if event.request_id != self.request_id or self.pending is None:
+            return
+        self.pending = None
+        if event.error:
+            self.error_message = "Could not compute matchups: " + event.error
+            self.mark_changed(MESSAGE_RECT)
+            return
+        self.store_sprites(event.enemy_team, event.fetched)
+        user_sprites = self.store_sprites(event.user_team, event.fetched)
+        self.pokemon_sprites.update({name.lower(): sprite for name, sprite in user_sprites.items()})
+        self.user_team = event.user_team
+        self.state = RESULT_SCREEN
+        self.dirty = True
+
+    def cancel_computation(self) -> None:
+        """Drops the running computation, if any, so its result is ignored when it arrives."""
+        self.request_id += 1
+        if self.pending is not None:
+            self.pending.cancel()
+            self.pending = None
+            self.mark_changed(MESSAGE_RECT)
+
+    def draw_progress(self) -> None:
+        """Displays an animated computing message while the worker is busy."""
+        if self.pending is not None:
+            self.progress_frame = pygame.time.get_ticks() // 400 % 4
+            progress_surface = render_text("Computing matchups" + "." * self.progress_frame, BLACK)
+            self.screen.blit(progress_surface, PROGRESS_RECT.topleft)
+
+    def redraw_progress(self) -> List[pygame.Rect]:
+        """Redraws only the computing message if its animation moved on, returning the area that changed."""
+        if self.pending is None or pygame.time.get_ticks() // 400 % 4 == self.progress_frame:
+            return []
+        self.screen.blit(self.background, PROGRESS_RECT, PROGRESS_RECT)
+        self.draw_progress()
+        return [PROGRESS_RECT]
 
     def draw_error_message(self) -> None:
         """Displays error message on screen."""
         if self.error_message:
-            error_surface = FONT.render(self.error_message, True, RED)
+            error_surface = render_text(self.error_message, RED)
             self.screen.blit(error_surface, (WIDTH // 2 - error_surface.get_width() // 2, HEIGHT - 130))
 
     def enter_enemy_team(self, event: pygame.event.Event) -> None:
-        """Handles input for enemy team Pokémon names."""
+        """Handles input for enemy team Pokémon names, cancelling a running computation if the team changes.
+
+        Only the slot that changed is given to the team analyzer, so the preview costs one Pokémon per key.
+        """
+        before = list(self.enemy_team)
+        self.edit_enemy_team(event)
+        self.mark_changed(INPUT_RECT)
+        changed = [slot for slot in range(6) if self.enemy_team[slot] != before[slot]]
+        if changed:
+            self.update_preview(changed)
+            if self.pending is not None:
+                self.cancel_computation()
+
+    def edit_enemy_team(self, event: pygame.event.Event) -> None:
+        """Applies one key press to the enemy team Pokémon names."""
         if event.key in (pygame.K_RETURN, pygame.K_DOWN):
             self.enemy_team[self.input_index] = self.enemy_team[self.input_index].strip()
             self.input_index = (self.input_index + 1) % 6  # down
@@ -279,24 +459,86 @@ class Game:
             self.input_index = (self.input_index - 1) % 6  # up
         elif event.key == pygame.K_BACKSPACE:
             self.enemy_team[self.input_index] = self.enemy_team[self.input_index][:-1]
+        elif event.key == pygame.K_TAB:
+            suggestion = self.get_completion(self.enemy_team[self.input_index])
+            if suggestion:
+                self.enemy_team[self.input_index] = suggestion
         else:
             self.enemy_team[self.input_index] += event.unicode.lower()
 
+    def mark_changed(self, rect: pygame.Rect) -> None:
+        """Marks an area of the input screen to be redrawn on the next frame."""
+        if rect not in self.changed:
+            self.changed.append(rect)
+
+    def redraw_changed(self) -> List[pygame.Rect]:
+        """Redraws only the areas marked as changed, returning them."""
+        changed, self.changed = self.changed, []
+        if self.state != INPUT_SCREEN:
+            return []
+        for rect in changed:
+            self.screen.set_clip(rect)
+            self.screen.blit(self.background, rect, rect)
+            if rect == INPUT_RECT:
+                self.draw_input_boxes()
+            else:
+                self.draw_error_message()
+                self.draw_progress()
+            self.screen.set_clip(None)
+        return changed
+
+    def draw_frame(self) -> None:
+        """Redraws the whole screen."""
+        self.screen.blit(self.background, (0, 0))
+        self.check_game_state()
+        pygame.display.flip()
+        self.dirty = False
+        self.changed = []
+
     def run(self) -> None:
-        """Runs the game loop."""
+        """Runs the game loop, redrawing only the parts of the screen that changed."""
+        clock = pygame.time.Clock()
         while self.running:
-            self.screen.blit(self.background, (0, 0))
+            if self.dirty:
+                self.draw_frame()
+            else:
+                pygame.display.update(self.redraw_changed() + self.redraw_progress())
             mouse_pos = pygame.mouse.get_pos()
-            self.check_game_state()
             for event in pygame.event.get():
                 self.handle_event(event, mouse_pos)
-            pygame.display.flip()
+            clock.tick(FPS)
+        self.cancel_computation()
+        self.worker.shutdown(wait=False, cancel_futures=True)
+        self.sprite_fetcher.close()
         pygame.quit()
 
 
-def generate_random_team(data: str) -> list[Pokemon]:
+@lru_cache(maxsize=256)
+def render_text(text: str, color: Tuple[int, int, int]) -> pygame.Surface:
+    """Returns the rendered surface of text, rendering each text and colour only once."""
+    return get_font().render(text, True, color)
+
+
+@lru_cache(maxsize=None)
+def get_font() -> pygame.font.Font:
+    """Returns the game font, loading it the first time text is drawn."""
+    return pygame.font.SysFont("consolas", 20)
+
+
+def preload_matchups() -> "TeamAnalyzer":
+    """Imports the matchup modules and loads the Pokédex on the worker thread, so startup does not wait for them.
+
+    Returns the team analyzer for the live preview on the input screen.
+    """
+    importlib.import_module("pokemon_final_team")
+    load_pokedex("pokemon_data.csv")
+    from graph_algorithm import TeamAnalyzer, cached_matrix_builder  # imported by pokemon_final_team
+    return TeamAnalyzer(cached_matrix_builder("chart.csv"))
+
+
+def generate_random_team(pokedex: Pokedex) -> list[str]:
     """Generates a random Pokémon team."""
-    return random.sample(data["Name"].tolist(), 6)
+    return random.sample([row[1] for row in pokedex.rows], 6)
 
 
 if __name__ == "__main__":
@@ -306,9 +548,9 @@ if __name__ == "__main__":
         'max-line-length': 120,
         'disable': ['E1136', 'W0221'],
         'max-nested-blocks': 4,
-        'allowed_modules': ['pygame', 'requests', 'pandas',
-                            'io', 'math', 'random', 'pokemon_data_scraper',
-                            'graph_algorithm', 'pokemon_final_team']
+        'allowed_modules': ['pygame', 'sprite_loader', 'importlib',
+                            'io', 'sys', 'math', 'random', 'instrumentation', 'functools', 'concurrent.futures',
+                            'pokemon_data_scraper', 'graph_algorithm', 'pokemon_final_team']
     })
 
     Game().run()
@@ -3,9 +3,15 @@
 """
 from __future__ import annotations
 
+import sys
 from typing import Optional
 from typing import Any
 
+import numpy as np
+
+# columns of TypeMatrix.masks
+HITS_SUPER_EFFECTIVE, HITS_NOT_VERY_EFFECTIVE, RESISTS, IMMUNE, WEAK_TO = range(5)
+
 
 class Type:
     """
@@ -41,6 +47,7 @@ class Pokemon:
         Speed)
         - bst: the base stat total of the Pokemon
     """
+    __slots__ = ('pokemon_id', 'name', 'type1', 'type2', 'stats', 'bst')
     pokemon_id: int
     name: str
     type1: Type
@@ -59,6 +66,145 @@ class Pokemon:
         self.bst = sum(self.stats)
 
 
+class PokemonRow(Pokemon):
+    """
+    A read-only view of one row of a PokemonTable, usable wherever a Pokemon is.
+
+    The Pokemon attributes are properties reading the table's columns, shadowing the slots Pokemon
+    declares for them; Pokemon.__init__ is not called, so those slots stay empty.
+
+    Instance Attributes:
+        - table: the table the row belongs to
+        - position: the row's position in the table
+    """
+    __slots__ = ('table', 'position')
+    table: PokemonTable
+    position: int
+
+    def __init__(self, table: PokemonTable, position: int) -> None:
+        self.table = table
+        self.position = position
+
+    @property
+    def pokemon_id(self) -> int:
+        """The unique Pokemon id."""
+        return int(self.table.ids[self.position])
+
+    @property
+    def name(self) -> str:
+        """The name of the Pokemon."""
+        return self.table.names[self.position]
+
+    @property
+    def type1(self) -> str:
+        """The primary type of the Pokemon."""
+        return self.table.type_names[self.table.type1[self.position]]
+
+    @property
+    def type2(self) -> Optional[str]:
+        """The secondary type of the Pokemon, or None."""
+        type2 = self.table.type2[self.position]
+        return self.table.type_names[type2] if type2 >= 0 else None
+
+    @property
+    def stats(self) -> list[int]:
+        """The stats a Pokemon made from the same data would hold."""
+        return self.table.stats[self.position, :5].tolist()
+
+    @property
+    def bst(self) -> int:
+        """The base stat total of the Pokemon."""
+        return int(self.table.bst[self.position])
+
+    def __repr__(self) -> str:
+        return f'PokemonRow({self.pokemon_id}, {self.name!r})'
+
+
+class PokemonTable:
+    """
+    Every Pokemon of a data file stored column by column.
+
+    Row views (PokemonRow) read their attributes from the columns, so they can stand in for Pokemon
+    objects without copying any data, and the counter team search reads the typing and bst columns
+    of the whole dex at once.
+
+    Instance Attributes:
+        - ids: the Pokemon ids
+        - names: the Pokemon names (interned)
+        - type_names: every type appearing in the data, in order of first appearance (interned)
+        - type1: the index in type_names of each Pokemon's primary type
+        - type2: the index in type_names of each Pokemon's secondary type, or -1
+        - stats: an n x 6 array of the numbers in each row after the types, in file order
+        - bst: the base stat total of each Pokemon, computed as Pokemon does from the first five of stats
+        - positions: a dictionary mapping each Pokemon id to the position of its first row
+
+    Representation Invariants:
+        - len(self.ids) == len(self.names) == len(self.type1) == len(self.type2) == len(self.stats)
+    """
+    ids: np.ndarray
+    names: list[str]
+    type_names: list[str]
+    type1: np.ndarray
+    type2: np.ndarray
+    stats: np.ndarray
+    bst: np.ndarray
+    positions: dict[int, int]
+
+    def __init__(self, rows: list[list]) -> None:
+        """Initialize the table from processed rows (see pokemon_data_scraper.process_row)."""
+        type_index = {}
+        for row in rows:
+            for type_name in row[2:4]:
+                if type_name and type_name not in type_index:
+                    type_index[type_name] = len(type_index)
+        self._set_columns(np.array([row[0] for row in rows], dtype=np.int64), [row[1] for row in rows],
+                          list(type_index), np.array([type_index[row[2]] for row in rows], dtype=np.int16),
+                          np.array([type_index[row[3]] if row[3] else -1 for row in rows], dtype=np.int16),
+                          np.array([row[4:10] for row in rows], dtype=np.int32).reshape(len(rows), 6))
+
+    @classmethod
+    def from_columns(cls, ids: np.ndarray, names: list[str], type_names: list[str], type1: np.ndarray,
+                     type2: np.ndarray, stats: np.ndarray) -> PokemonTable:
+        """Return the table over the given columns without copying them, e.g. views of a mapped compiled file."""
+        table = cls.__new__(cls)
+        table._set_columns(ids, names, type_names, type1, type2, stats)
+        return table
+
+    def _set_columns(self, ids: np.ndarray, names: list[str], type_names: list[str], type1: np.ndarray,
+                     type2: np.ndarray, stats: np.ndarray) -> None:
+        """Store the columns, interning the strings, and derive bst and positions from them."""
+        self.type_names = [sys.intern(type_name) for type_name in type_names]
+        self.names = [sys.intern(name) for name in names]
+        self.ids = ids
+        self.type1 = type1
+        self.type2 = type2
+        self.stats = stats
+        self.bst = self.stats[:, :5].sum(axis=1)
+        self.positions = {}
+        for position, pokemon_id in enumerate(self.ids.tolist()):
+            self.positions.setdefault(pokemon_id, position)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, position: int) -> PokemonRow:
+        return PokemonRow(self, position)
+
+    def get_many(self, pokemon_ids: list[int]) -> list[PokemonRow]:
+        """Return the rows of pokemon_ids in the given order, skipping ids that do not exist."""
+        positions = self.positions
+        return [PokemonRow(self, positions[poke_id]) for poke_id in pokemon_ids if poke_id in positions]
+
+    def typing_codes(self) -> np.ndarray:
+        """Return a number per row that is equal for two rows exactly when their typings are."""
+        return self.type1.astype(np.int64) * (len(self.type_names) + 1) + self.type2 + 1
+
+    def typing_of(self, position: int) -> str | tuple[str, str]:
+        """Return the typing of a row: its type, or a (type 1, type 2) tuple."""
+        row = self[position]
+        return (row.type1, row.type2) if row.type2 is not None else row.type1
+
+
 class TypeVertex:
     """
     A class to represent a vertex in a directed graph of Pokémon types.
@@ -88,23 +234,172 @@ class TypeVertex:
         self.incoming_neighbors = {0.0: set(), 0.5: set(), 1.0: set(), 2.0: set()}
 
 
+class TypeMatrix:
+    """
+    A dense type effectiveness chart, compiled from the same data as a TypeGraph.
+
+    Instance Attributes:
+        - types: the type names in chart order
+        - index: a dictionary mapping each type name to its row/column in chart
+        - chart: an n x n array where chart[i][j] is the effectiveness of types[i] attacking types[j]
+        - typings: every mono typing in chart order followed by every dual typing (types[i], types[j]) with i < j
+        - typing_index: a dictionary mapping a typing (either order for dual types) to its row in the tables below
+        - defense: a len(typings) x n array where defense[t][a] is the effectiveness of types[a] against typings[t]
+        - offense: a len(typings) x len(typings) array where offense[t][u] is the best effectiveness of either
+        type of typings[t] attacking typings[u]
+        - masks: a len(typings) x 5 integer array of bitmasks over types (bit i is types[i]), with columns
+        HITS_SUPER_EFFECTIVE, HITS_NOT_VERY_EFFECTIVE (including no effect), RESISTS (including immune),
+        IMMUNE and WEAK_TO
+
+    Representation Invariants:
+        - len(self.typings) == n + n * (n - 1) // 2
+    """
+    types: list[str]
+    index: dict[str, int]
+    chart: np.ndarray
+    typings: list[str | tuple[str, str]]
+    typing_index: dict[str | tuple[str, str], int]
+    defense: np.ndarray
+    offense: np.ndarray
+    masks: np.ndarray
+    _rows: list[list[float]]
+    _defense_rows: list[list[float]]
+
+    def __init__(self, types: list[str], effectiveness: list[list[float]]) -> None:
+        self.types = list(types)
+        self.index = {type_name: idx for idx, type_name in enumerate(self.types)}
+        self.chart = np.asarray(effectiveness, dtype=float)  # a compiled chart is used as mapped, without a copy
+        # plain python rows for scalar lookups, indexing numpy one cell at a time is slower
+        self._rows = self.chart.tolist()
+        self._build_typing_tables()
+
+    def _build_typing_tables(self) -> None:
+        """Precompute the defensive and offensive tables for every mono and dual typing."""
+        n = len(self.types)
+        pairs = [(i, j) for i in range(n) for j in range(i + 1, n)]
+        self.typings = self.types + [(self.types[i], self.types[j]) for i, j in pairs]
+        self.typing_index = {}
+        for row, typing in enumerate(self.typings):
+            self.typing_index[typing] = row
+            if isinstance(typing, tuple):
+                self.typing_index[(typing[1], typing[0])] = row
+
+        first = np.array(list(range(n)) + [i for i, _ in pairs])
+        second = np.array(list(range(n)) + [j for _, j in pairs])
+        mono = np.arange(len(self.typings)) < n
+        # a dual defender takes the product of both multipliers, a mono defender just its own column
+        self.defense = np.where(mono[:, None], self.chart[:, first].T,
+                                self.chart[:, first].T * self.chart[:, second].T)
+        # an attacker picks the better of its two STAB types against each defending typing
+        self.offense = np.maximum(self.defense[:, first].T, self.defense[:, second].T)
+        self._defense_rows = self.defense.tolist()
+
+        bits = np.int64(1) << np.arange(n, dtype=np.int64)
+        mono_offense = self.offense[:, :n]
+        self.masks = np.stack([(mono_offense > 1.0) @ bits, (mono_offense < 1.0) @ bits,
+                               (self.defense < 1.0) @ bits, (self.defense == 0.0) @ bits,
+                               (self.defense > 1.0) @ bits], axis=1)
+
+    def mask_types(self, mask: int) -> list[str]:
+        """Return the names of the types whose bits are set in mask, in chart order."""
+        return [type_name for i, type_name in enumerate(self.types) if mask >> i & 1]
+
+    def typing_row(self, typing: str | tuple) -> int:
+        """Return the table row of a typing, treating a repeated dual type such as ('Water', 'Water') as mono."""
+        if isinstance(typing, tuple) and len(set(typing)) == 1:
+            typing = typing[0]
+        return self.typing_index[typing]
+
+    def weight(self, attacker: str, defender: str) -> float:
+        """Return the effectiveness of a single attacking type against a single defending type."""
+        return self._rows[self.index[attacker]][self.index[defender]]
+
+    def effectiveness(self, attacker: str, defender: str | tuple) -> float:
+        """Return the effectiveness of attacker against defender (product for dual types)."""
+        if isinstance(defender, tuple) and defender in self.typing_index:
+            return self._defense_rows[self.typing_index[defender]][self.index[attacker]]
+        row = self._rows[self.index[attacker]]
+        if isinstance(defender, tuple):
+            multiplier = 1.0
+            for defend_type in defender:
+                multiplier *= row[self.index[defend_type]]
+            return multiplier
+        return row[self.index[defender]]
+
+
 class TypeGraph:
     """
         A class to represent the types and the interactions.
 
+        Every edge is kept in an adjacency matrix indexed by vertex position, which edge_weight reads in
+        constant time. The weight buckets of each TypeVertex hold the same edges; for graphs made with
+        from_chart they are only built when vertices is first used.
+
         Instance Attributes:
             - verticies: a dictionary representing the graphs verticies
+            - items: the items of the vertices in the order they were added
+            - index: a dictionary mapping each item to its position in items
+            - weights: the adjacency matrix, where weights[i][j] is the weight of the edge items[i] -> items[j],
+            or None if there is no such edge
+            - matrix: the compiled effectiveness matrix for the same chart, if one was built
+
+        Representation Invariants:
+            - len(self.weights) == len(self.items) == len(self.index)
+            - all(len(row) == len(self.items) for row in self.weights)
         """
-    vertices: dict[Any, TypeVertex]
+    items: list[Any]
+    index: dict[Any, int]
+    weights: list[list[Optional[float]]]
+    matrix: Optional[TypeMatrix]
+    _vertices: Optional[dict[Any, TypeVertex]]
+    _neighbours: dict[Any, tuple[dict[float, list], dict[float, list]]]
 
     def __init__(self) -> None:
-        self.vertices = {}  # Initialize Empty Graph
+        self._vertices = {}  # Initialize Empty Graph
+        self.items = []
+        self.index = {}
+        self.weights = []
+        self.matrix = None
+        self._neighbours = {}
+
+    @classmethod
+    def from_chart(cls, types: list[str], effectiveness: list[list[float]]) -> TypeGraph:
+        """Return the graph with an edge from every type to every type, weighted by the chart."""
+        graph = cls()
+        graph.items = list(types)
+        graph.index = {item: position for position, item in enumerate(graph.items)}
+        graph.weights = [[float(weight) for weight in row] for row in effectiveness]
+        graph._vertices = None
+        return graph
+
+    @property
+    def vertices(self) -> dict[Any, TypeVertex]:
+        """The vertices of the graph, with their edges bucketed by weight."""
+        if self._vertices is None:
+            self._vertices = {item: TypeVertex(item, {}, {}) for item in self.items}
+            for i, item1 in enumerate(self.items):
+                for j, item2 in enumerate(self.items):
+                    if self.weights[i][j] is not None:
+                        self._add_to_buckets(item1, item2, self.weights[i][j])
+        return self._vertices
 
     def add_vertex(self, item: Any) -> None:
         """add incoming and outcoming neighbours to vertices in graph
         """
         self.vertices[item] = TypeVertex(item, {0.0: set(), 0.5: set(), 1.0: set(), 2.0: set()},
                                          {0.0: set(), 0.5: set(), 1.0: set(), 2.0: set()})
+        if item in self.index:  # a vertex added again starts without edges, like its new TypeVertex
+            position = self.index[item]
+            self.weights[position] = [None] * len(self.items)
+            for row in self.weights:
+                row[position] = None
+        else:
+            self.index[item] = len(self.items)
+            self.items.append(item)
+            for row in self.weights:
+                row.append(None)
+            self.weights.append([None] * len(self.items))
+        self._neighbours.clear()
 
     def add_attacking_edge(self, item1: Any, item2: Any, weight: float) -> None:
         """
@@ -115,43 +410,56 @@ class TypeGraph:
         :param weight: The effectiveness of the attack (2.0,1.0,0.5,0)
         :return: None
         """
-        if item1 in self.vertices and item2 in self.vertices:
-            if item1 != item2:
-                self.vertices[item1].outgoing_neighbors[weight].add(self.vertices[item2])
-                self.vertices[item2].incoming_neighbors[weight].add(self.vertices[item1])
-            if item1 == item2:
-                self.vertices[item1].outgoing_neighbors[weight].add(self.vertices[item2])
-                self.vertices[item1].incoming_neighbors[weight].add(self.vertices[item2])
+        if item1 in self.index and item2 in self.index:
+            self._add_to_buckets(item1, item2, weight)
+            self.weights[self.index[item1]][self.index[item2]] = weight
+            self._neighbours.clear()
+
+    def _add_to_buckets(self, item1: Any, item2: Any, weight: float) -> None:
+        """Add the edge item1 -> item2 to the weight buckets of both vertices."""
+        vertices = self.vertices
+        if item1 != item2:
+            vertices[item1].outgoing_neighbors[weight].add(vertices[item2])
+            vertices[item2].incoming_neighbors[weight].add(vertices[item1])
+        if item1 == item2:
+            vertices[item1].outgoing_neighbors[weight].add(vertices[item2])
+            vertices[item1].incoming_neighbors[weight].add(vertices[item2])
+
+    def edge_weight(self, item1: Any, item2: Any) -> Optional[float]:
+        """Return the weight of the edge item1 -> item2, or None if there is no such edge."""
+        if item1 in self.index and item2 in self.index:
+            return self.weights[self.index[item1]][self.index[item2]]
+        return None
+
+    def neighbours(self, item: Any) -> tuple[dict[float, list], dict[float, list]]:
+        """Return the items that item attacks and that attack item, each grouped by weight in vertex order.
+
+        The lists are cached until the graph changes, so callers must not modify them.
+        """
+        if item not in self._neighbours:
+            position = self.index[item]
+            outgoing = {}
+            incoming = {}
+            for other_position, other in enumerate(self.items):
+                weight = self.weights[position][other_position]
+                if weight is not None:
+                    outgoing.setdefault(weight, []).append(other)
+                weight = self.weights[other_position][position]
+                if weight is not None:
+                    incoming.setdefault(weight, []).append(other)
+            self._neighbours[item] = (outgoing, incoming)
+        return self._neighbours[item]
 
     def spesific_vertex_connections(self, item1: Any):
         """specify specific vertex connections
         """
-        one_half_attacks = []
-        one_half_incoming = []
-        two_attacks = []
-        two_incoming = []
-        one_attacks = []
-        one_incoming = []
-        zero_attacks = []
-        zero_incoming = []
-        if item1 in self.vertices:
-            for weight, outgoing_connections in self.vertices[item1].outgoing_neighbors.items():
-                if weight == 2.0:
-                    two_attacks.extend([elem.item for elem in outgoing_connections])
-                elif weight == 1.0:
-                    one_attacks.extend([elem.item for elem in outgoing_connections])
-                elif weight == 0.5:
-                    one_half_attacks.extend([elem.item for elem in outgoing_connections])
-                else:
-                    zero_attacks.append(outgoing_connections)
-            for weight, incoming_connections in self.vertices[item1].incoming_neighbors.items():
-                if weight == 2.0:
-                    two_incoming.extend([elem.item for elem in incoming_connections])
-                elif weight == 1.0:
-                    one_incoming.extend([elem.item for elem in incoming_connections])
-                elif weight == 0.5:
-                    one_half_incoming.extend([elem.item for elem in incoming_connections])
-                else:
-                    zero_incoming.extend([elem.item for elem in incoming_connections])
-        return (one_half_attacks, one_half_incoming, one_attacks, one_incoming, two_attacks, two_incoming,
+        if item1 not in self.index:
+            return [], [], [], [], [], [], [], []
+        outgoing, incoming = self.neighbours(item1)
+        # weights other than 2, 1 and 0.5 count as no effect; the attacks are given as the bucket itself
+        zero_attacks = [self.vertices[item1].outgoing_neighbors[0.0]]
+        zero_incoming = [other for weight, others in incoming.items() if weight not in (2.0, 1.0, 0.5)
+                         for other in others]
+        return (list(outgoing.get(0.5, [])), list(incoming.get(0.5, [])), list(outgoing.get(1.0, [])),
+                list(incoming.get(1.0, [])), list(outgoing.get(2.0, [])), list(incoming.get(2.0, [])),
                 zero_attacks, zero_incoming)
@@ -1,4 +1,217 @@
+from __future__ import annotations
+
 import csv
+from bisect import bisect_left, bisect_right
+from typing import Optional
+
+import compiled_data
+import instrumentation
+from result_cache import FileCache
+
+
+def format_pokemon_name(pokemon_name: str) -> str:
+  """Fold a Pokemon name the way sprite urls spell it, e.g. 'Mr. Mime' -> 'mr-mime', 'Nidoran♀' -> 'nidoran-f'."""
+  return (
+      pokemon_name.lower()
+      .replace(" ", "-")
+      .replace(".", "")
+      .replace("'", "")
+      .replace("♀", "-f")
+      .replace("♂", "-m")
+      .replace(": ", "-")
+      .replace("é", "e")
+  )
+
+
+class NameTrie:
+    """
+    A prefix tree over folded Pokemon names for as-you-type completion.
+
+    Each node stores the names of every Pokemon below it, so completing a prefix only walks the prefix.
+
+    Instance Attributes:
+        - children: a dictionary mapping the next character to the child node
+        - names: the display names of every Pokemon whose folded name starts with this node's prefix,
+        in insertion order
+    """
+    children: dict[str, NameTrie]
+    names: list[str]
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.names = []
+
+    def insert(self, key: str, name: str) -> None:
+        """Add name under the folded key."""
+        node = self
+        node.names.append(name)
+        for char in key:
+            node = node.children.setdefault(char, NameTrie())
+            node.names.append(name)
+
+    def complete(self, prefix: str, limit: Optional[int] = None) -> list[str]:
+        """Return up to limit display names whose folded name starts with the folded key prefix."""
+        node = self
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.names[:limit]
+
+
+class TypingIndex:
+    """
+    The rows of a Pokedex grouped by typing, each group sorted by base stat total.
+
+    Every row is listed under its typing as written in the file (a type name, or a (type 1, type 2)
+    tuple) and, separately, under its first type, so the rows of a typing within a bst range are
+    found by bisecting one or two groups instead of scanning the dex.
+
+    Instance Attributes:
+        - by_typing: a dictionary mapping each typing to (the bsts of its rows ascending, their positions)
+        - by_first_type: a dictionary mapping each type to (the bsts of the rows it is the first type of,
+        their positions)
+        - bsts: the base stat total of the Pokemon each row's id refers to, by position
+    """
+    by_typing: dict[str | tuple[str, str], tuple[list[int], list[int]]]
+    by_first_type: dict[str, tuple[list[int], list[int]]]
+    bsts: list[int]
+
+    def __init__(self, rows: list[list], by_id: dict[int, list]) -> None:
+        # ids are resolved through by_id, which is where get_pokemon takes a Pokemon's stats from
+        self.bsts = [sum(by_id[row[0]][4:9]) for row in rows]
+        by_typing = {}
+        by_first_type = {}
+        for position, row in enumerate(rows):
+            typing = (row[2], row[3]) if row[3] else row[2]
+            by_typing.setdefault(typing, []).append((self.bsts[position], position))
+            by_first_type.setdefault(row[2], []).append((self.bsts[position], position))
+        self.by_typing = {typing: _split_sorted(group) for typing, group in by_typing.items()}
+        self.by_first_type = {type_name: _split_sorted(group) for type_name, group in by_first_type.items()}
+
+    def groups(self, typing: str | tuple[str, str]) -> list[tuple[list[int], list[int]]]:
+        """Return the groups holding the rows of typing and, for a single type, the rows it is the first type of."""
+        groups = [self.by_typing[typing]] if typing in self.by_typing else []
+        if typing in self.by_first_type:
+            groups.append(self.by_first_type[typing])
+        return groups
+
+    def in_range(self, typing: str | tuple[str, str], low: int, high: int) -> set[int]:
+        """Return the positions of the rows matching typing whose bst is between low and high inclusive."""
+        found = set()
+        for bsts, positions in self.groups(typing):
+            found.update(positions[bisect_left(bsts, low):bisect_right(bsts, high)])
+        return found
+
+    def matching(self, typing: str | tuple[str, str]) -> set[int]:
+        """Return the positions of every row matching typing."""
+        found = set()
+        for _, positions in self.groups(typing):
+            found.update(positions)
+        return found
+
+
+def _split_sorted(group: list[tuple[int, int]]) -> tuple[list[int], list[int]]:
+  """Return the bsts and positions of a group sorted by bst, then position."""
+  group.sort()
+  return [bst for bst, _ in group], [position for _, position in group]
+
+
+class Pokedex:
+    """
+    Every row of a Pokemon data file, loaded once and indexed for constant time lookups.
+
+    Instance Attributes:
+        - rows: the processed rows (see process_row) in file order
+        - by_id: a dictionary mapping each Pokemon id to its row
+        - by_name: a dictionary mapping each lowercased Pokemon name to its row
+        - by_key: a dictionary mapping each folded Pokemon name (see format_pokemon_name) to its row
+        - positions: a dictionary mapping each Pokemon id to the position of its row in rows
+    """
+    rows: list[list]
+    by_id: dict[int, list]
+    by_name: dict[str, list]
+    by_key: dict[str, list]
+    positions: dict[int, int]
+    _trie: Optional[NameTrie]
+    _typing_index: Optional[TypingIndex]
+
+    def __init__(self, rows: list[list]) -> None:
+        self.rows = rows
+        self.by_id = {}
+        self.by_name = {}
+        self.by_key = {}
+        self.positions = {}
+        self._trie = None
+        self._typing_index = None
+        for position, row in enumerate(rows):
+            # keep the first occurrence, matching the order a scan of the file would find it in
+            if row[0] not in self.by_id:
+                self.by_id[row[0]] = row
+                self.positions[row[0]] = position
+            self.by_name.setdefault(row[1].lower(), row)
+            self.by_key.setdefault(format_pokemon_name(row[1]), row)
+
+    def get(self, pokemon_id: int) -> Optional[list]:
+        """Return the row for pokemon_id, or None if there is no such Pokemon."""
+        return self.by_id.get(pokemon_id)
+
+    def get_many(self, pokemon_ids: list[int]) -> list[list]:
+        """Return the rows for pokemon_ids in the given order, skipping ids that do not exist."""
+        by_id = self.by_id
+        return [by_id[poke_id] for poke_id in pokemon_ids if poke_id in by_id]
+
+    def get_by_name(self, pokemon_name: str) -> Optional[list]:
+        """Return the row for pokemon_name, or None if there is no such Pokemon.
+
+        Case, spacing, punctuation, gender symbols and accents are folded, so 'mr mime' finds 'Mr. Mime'.
+        """
+        row = self.by_name.get(pokemon_name.lower())
+        if row is None:
+            row = self.by_key.get(format_pokemon_name(pokemon_name.strip()))
+        return row
+
+    def complete(self, prefix: str, limit: Optional[int] = None) -> list[str]:
+        """Return up to limit Pokemon names that start with prefix, in file order."""
+        if self._trie is None:
+            self._trie = NameTrie()
+            for row in self.rows:
+                self._trie.insert(format_pokemon_name(row[1]), row[1])
+        return self._trie.complete(format_pokemon_name(prefix.lstrip()), limit)
+
+    def typing_index(self) -> TypingIndex:
+        """Return the rows indexed by typing and bst, building the index the first time."""
+        if self._typing_index is None:
+            self._typing_index = TypingIndex(self.rows, self.by_id)
+        return self._typing_index
+
+
+def read_pokedex(path: str) -> Pokedex:
+  """Return a new Pokedex of the file at path, from its compiled form if that is current."""
+  rows = compiled_data.load_pokedex_rows(path)
+  if rows is not None:
+      instrumentation.count('compiled loads')
+  else:
+      with open(path) as file:
+          reader = csv.reader(file)
+          next(reader)  # skip header row
+          rows = [process_row(row) for row in reader if row]
+      instrumentation.count('rows scanned', reader.line_num)
+  return Pokedex(rows)
+
+
+# resolved data path -> the Pokedex of its current version, shared by every caller in the process
+DEX_CACHE = FileCache(read_pokedex, 'dex cache')
+
+
+@instrumentation.timed
+def load_pokedex(filename: str) -> Pokedex:
+  """Return the Pokedex for filename, reusing the one already loaded unless the file has changed.
+
+  The returned Pokedex is shared, so callers must not modify its rows.
+  """
+  return DEX_CACHE.get(filename)
+
 
 def get_pokemon_data(pokemon_ids: list[int], filename: str) -> list:
   """Return the data for a specific Pokemon
@@ -6,17 +219,10 @@ def get_pokemon_data(pokemon_ids: list[int], filename: str) -> list:
   Preconditions:
     - pokemon_ids are a valid Pokemon ids
   """
-  data = []
-
-  with open(filename) as file:
-      reader = csv.reader(file)
-      next(reader)  # skip header row
-
-      for row in reader:
-        if int(row[0]) in pokemon_ids:
-          data.append(process_row(row))
-
-  return data
+  dex = load_pokedex(filename)
+  found = [poke_id for poke_id in set(pokemon_ids) if poke_id in dex.by_id]
+  found.sort(key=dex.positions.__getitem__)  # same order a scan of the file returns them in
+  return [list(dex.by_id[poke_id]) for poke_id in found]
 
 def process_row(row: list[str]) -> list:
   """Convert a row of pokemon data to a list with more appropriate data types."""
@@ -33,24 +239,20 @@ def process_row(row: list[str]) -> list:
 
 def convert_pokemon_to_id(pokemon_name: str, filename: str) -> int:
   """Convert a pokemon name to its id"""
-  with open(filename) as file:
-      reader = csv.reader(file)
-      next(reader)  # skip header row
-
-      for row in reader:
-          if row[1].lower() == pokemon_name.lower():
-              return int(row[0])
+  row = load_pokedex(filename).get_by_name(pokemon_name)
+  if row is not None:
+      return row[0]
   return None
+
+def complete_pokemon_name(prefix: str, filename: str, limit: Optional[int] = 10) -> list[str]:
+  """Return up to limit pokemon names starting with prefix"""
+  return load_pokedex(filename).complete(prefix, limit)
           
 def get_pokemon_type(pokemon_name: str, filename: str) -> str:
   """Get the type of a pokemon"""
-  with open(filename) as file:
-      reader = csv.reader(file)
-      next(reader)
-
-      for row in reader:
-          if row[1].lower() == pokemon_name.lower():
-              return (row[2], row[3])
+  row = load_pokedex(filename).get_by_name(pokemon_name)
+  if row is not None:
+      return (row[2], row[3])
 
 if __name__ == '__main__':
     get_pokemon_data([1,2,3], filename='pokemon_data.csv')
@@ -1,11 +1,30 @@
 """functions and helpers to get the final team
 
 """
-import csv
+import heapq
+from collections import Counter
+import numpy as np
+import compiled_data
+import instrumentation
 import pokemon_data_scraper
-from pokemon_class import Pokemon
-from graph_algorithm import recommend_top_types
+from pokemon_class import Pokemon, PokemonTable
+from graph_algorithm import recommend_top_types, cached_matrix_builder, candidate_score_table
 from pokemon_data_scraper import convert_pokemon_to_id
+from result_cache import FileCache, LRUCache, file_stamp
+
+# (data file, recommended types, bst range) -> user team names, see get_user_pokemon
+USER_TEAM_CACHE = LRUCache(maxsize=1024)
+
+
+def read_pokemon_table(path):
+    """get a new columnar table of every pokemon in path, over its compiled form if that is current
+    """
+    table = compiled_data.load_pokemon_table(path)
+    return table if table is not None else PokemonTable(pokemon_data_scraper.load_pokedex(path).rows)
+
+
+# resolved data path -> the PokemonTable of its current version, see get_pokemon_table
+POKEMON_TABLES = FileCache(read_pokemon_table)
 
 
 def get_team_bst(team: Pokemon | list[Pokemon]):
@@ -31,30 +50,19 @@ def ideal_bst_range(team: Pokemon | list[Pokemon]):
         return [min_bst, max_bst]
 
 
+def get_pokemon_table(file_path='pokemon_data.csv'):
+    """get the columnar table of every pokemon in file_path, built once per version of the file
+    """
+    return POKEMON_TABLES.get(file_path)
+
+
+@instrumentation.timed
 def get_pokemon(team: list[int], file_path='pokemon_data.csv'):
     """get pokemon based on pokemon numbers
+
+    The pokemon are row views of the file's PokemonTable, with the same attributes as Pokemon.
     """
-    poke_list = []
-    # pokemon = Pokemon(0, '', Type('', {'':0.0}), Type('', {}), 0, 0, 0, 0, 0)
-    for poke in team:
-        data = pokemon_data_scraper.get_pokemon_data([poke], file_path)
-
-        if not data or not data[0]:
-            continue
-
-        pokemon = Pokemon(
-            pokemon_id=data[0][0],
-            name=data[0][1],
-            type1=data[0][2],
-            type2=data[0][3] if data[0][3] else None,
-            attack=data[0][4],
-            defense=data[0][5],
-            spec_attack=data[0][6],
-            spec_defense=data[0][7],
-            speed=data[0][8]
-        )
-        poke_list.append(pokemon)
-    return poke_list
+    return get_pokemon_table(file_path).get_many(team)
 
 
 def filter_bst_team(team: list[Pokemon], bst_range: list[int]):
@@ -88,33 +96,185 @@ def convert_team_to_ints(team) -> list[int]:
     return id_list
 
 
-def get_user_pokemon(team: list[Pokemon], file_pokemon='pokemon_data.csv', file_types='chart.csv'):
-    """get enemy pokemon based on bst and type"""
+@instrumentation.timed
+def get_user_pokemon(team: list[Pokemon], file_pokemon='pokemon_data.csv', file_types='chart.csv',
+                     assignment='greedy'):
+    """get enemy pokemon based on bst and type
+
+    assignment is passed on to recommend_top_types; 'optimal' pairs types with enemies by matching.
+    With assignment='exact' the team is the provably best one from the whole dex, see best_counter_team.
+    The chosen names only depend on the set of recommended types and the bst range, so they are cached
+    on those; the type matchups come from recommend_top_types, which has its own cache.
+    """
+    if assignment == 'exact':
+        return best_counter_team(team, file_pokemon, file_types)
     enemy_types = get_types(team)
-    top_types = recommend_top_types(enemy_types, file_types, len(team))
+    top_types = recommend_top_types(enemy_types, file_types, len(team), assignment)
     enemy_types = [item[0] for item in top_types]
     enemy_bst_range = ideal_bst_range(team)
-    possible_poke = []
 
-    with open(file_pokemon, 'r') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            poke_types = (row[2], row[3]) if row[3] else row[2]
+    key = (file_stamp(file_pokemon), tuple(sorted(set(enemy_types), key=repr)), tuple(enemy_bst_range))
+    names = USER_TEAM_CACHE.get(key)
+    instrumentation.count('user team cache hits' if names is not None else 'user team cache misses')
+    if names is None:
+        names = tuple(select_user_pokemon(enemy_types, enemy_bst_range, file_pokemon))
+        USER_TEAM_CACHE.put(key, names)
+    return list(names), top_types
+
+
+@instrumentation.timed
+def select_user_pokemon(enemy_types: list, enemy_bst_range: list[int], file_pokemon='pokemon_data.csv'):
+    """get the names of the strongest pokemon of the recommended types within the bst range
+
+    A pokemon matches a recommended type if its typing is that type, or its first type is. The matches
+    within the bst range come from bisecting the dex's typing index, and only the best six are picked.
+    """
+    dex = pokemon_data_scraper.load_pokedex(file_pokemon)
+    index = dex.typing_index()
+    low, high = enemy_bst_range
+    wanted = set(enemy_types)
+
+    in_range = set()
+    for typing in wanted:
+        in_range |= index.in_range(typing, low, high)
+    instrumentation.count('candidates selected', len(in_range))
+    # ties go to the pokemon found first in the file, as with a stable sort
+    chosen = [(-index.bsts[position], 0, position) for position in in_range]
 
-            if poke_types in [item[0] for item in top_types] or row[2] in enemy_types:
-                possible_poke.append(int(row[0]))
+    if len(in_range) < 6:  # case where multiple of the same pokemon are inputted
+        matching = set()
+        for typing in wanted:
+            matching |= index.matching(typing)
+        extra = sorted(matching - in_range)[:6 - len(in_range)]
+        chosen.extend((-index.bsts[position], 1, position) for position in extra)
 
-    poke_data = get_pokemon(possible_poke, file_pokemon)
-    po_data = filter_bst_team(poke_data, enemy_bst_range)
+    return [dex.by_id[dex.rows[position][0]][1] for _, _, position in heapq.nsmallest(6, chosen)]
+
+
+@instrumentation.timed
+def best_counter_team(team: list[Pokemon], file_pokemon='pokemon_data.csv', file_types='chart.csv', size=6):
+    """get the provably best team of size pokemon from the whole dex against the given team
+
+    A team is scored the way score_candidate scores a typing, but per enemy: each enemy adds the best
+    matchup any team member has against it. Ties go to the higher total bst. Returns the names and,
+    for each enemy, the typing of the member that counters it.
+
+    Since there are at least as many members as enemies, the best score gives every enemy one of its
+    best possible counters, so the search is a branch and bound over sets of such counters, filling the
+    rest of the team by bst. Pokemon with the same typing and bst are collapsed into one group, groups
+    that enough other pokemon beat against every enemy and on bst are dropped, and a branch is cut when
+    its bst plus the best possible fill cannot beat the best team found so far.
+
+    Preconditions:
+        - size >= len(team)
+    """
+    matrix = cached_matrix_builder(file_types)
+    enemy_rows = list(dict.fromkeys(matrix.typing_row(enemy) for enemy in get_types(team)))
+    # matchup scores are multiples of 0.25, so compare them in quarters to keep them exact
+    quarter_scores = (candidate_score_table(matrix)[:, enemy_rows] * 4).round().astype(int).tolist()
+
+    table = get_pokemon_table(file_pokemon)
+    _, first_positions, code_of_row = np.unique(table.typing_codes(), return_index=True, return_inverse=True)
+    typing_rows = np.array([matrix.typing_row(table.typing_of(position)) for position in first_positions])
+    groups = {}
+    for key, name in zip(zip(typing_rows[code_of_row].tolist(), table.bst.tolist()), table.names):
+        groups.setdefault(key, []).append(name)
+    kept = {}
+    for (typing_row, bst), names in sorted(groups.items(), key=lambda item: -item[0][1]):
+        # any team with more than size of one typing could swap the lowest bst one for a higher one
+        if sum(len(other) for _, other in kept.get(typing_row, [])) < size:
+            kept.setdefault(typing_row, []).append((bst, names))
+    candidates = [(quarter_scores[typing_row], bst, names, typing_row)
+                  for typing_row, options in kept.items() for bst, names in options]
+    candidates = _drop_dominated(candidates, size)
+    candidates.sort(key=lambda cand: -cand[1])
+
+    team_indices = _search_counter_team(candidates, len(enemy_rows), size)
+
+    names = []
+    picked = Counter()
+    for i in team_indices:
+        names.append(candidates[i][2][picked[i]])
+        picked[i] += 1
+    matchups = []
+    for enemy in get_types(team):
+        column = enemy_rows.index(matrix.typing_row(enemy))
+        counter = max(team_indices, key=lambda i: candidates[i][0][column])
+        matchups.append((matrix.typings[candidates[counter][3]], enemy))
+    return names, matchups
+
+
+def _drop_dominated(candidates, size):
+    """drop the groups that at least size other pokemon match or beat against every enemy and on bst
+
+    Any team holding a dropped pokemon leaves one of those others out, and swapping it in is never worse.
+    """
+    scores = np.array([cand[0] for cand in candidates]).reshape(len(candidates), -1)
+    bsts = np.array([cand[1] for cand in candidates])
+    copies = np.array([len(cand[2]) for cand in candidates])
+    kept = []
+    for i, cand in enumerate(candidates):
+        covers = (scores >= scores[i]).all(axis=1) & (bsts >= bsts[i])
+        # between exact ties only the earlier group counts, so tied groups cannot drop each other
+        ties = (scores == scores[i]).all(axis=1) & (bsts == bsts[i])
+        covers[i:] &= ~ties[i:]
+        # copies of the same group also stand in for each other
+        if copies[covers].sum() + copies[i] - 1 < size:
+            kept.append(cand)
+    return kept
+
+
+def _search_counter_team(candidates, enemies, size):
+    """return the candidate indices (repeated for copies) of the best team, see best_counter_team
+
+    Preconditions:
+        - candidates are sorted by bst, highest first
+    """
+    best_counter = [max(cand[0][e] for cand in candidates) for e in range(enemies)]
+    # the groups holding one of the best counters for each enemy, highest bst first
+    counters = [[i for i, cand in enumerate(candidates) if cand[0][e] == best_counter[e]] for e in range(enemies)]
+    top_bst = []
+    for cand in candidates:
+        top_bst.extend([cand[1]] * min(len(cand[2]), size))
+    top_bst = top_bst[:size]
+    best = {'bst': -1, 'team': []}
+    seen = set()
 
-    if len(po_data) < 6:  # case where multiple of the same pokemon are inputted
-        remaining_needed = 6 - len(po_data)
-        additional_pokemon = [poke for poke in poke_data if poke not in po_data][:remaining_needed]
-        po_data.extend(additional_pokemon)
+    def fill(chosen):
+        """complete chosen with the highest bst pokemon left"""
+        team = list(chosen)
+        used = Counter(chosen)
+        for i, cand in enumerate(candidates):
+            while len(team) < size and used[i] < len(cand[2]):
+                team.append(i)
+                used[i] += 1
+        return team
 
-    pok_sorted = sorted(po_data, key=lambda x: x.bst, reverse=True)[:6]
+    def search(chosen, covered, bst_total):
+        key = tuple(sorted(chosen))
+        if key in seen or bst_total + sum(top_bst[:size - len(chosen)]) <= best['bst']:
+            return
+        seen.add(key)  # the same counters picked in another order lead to the same teams
+        uncovered = [e for e in range(enemies) if e not in covered]
+        if not uncovered:
+            team = fill(chosen)
+            total = sum(candidates[i][1] for i in team)
+            if total > best['bst']:
+                best['bst'], best['team'] = total, team
+            return
+        if len(chosen) == size:
+            return
+        # branch on the enemy with the fewest best counters
+        enemy = min(uncovered, key=lambda e: len(counters[e]))
+        for i in counters[enemy]:
+            if chosen.count(i) < len(candidates[i][2]):
+                beaten = {e for e in uncovered if candidates[i][0][e] == best_counter[e]}
+                chosen.append(i)
+                search(chosen, covered | beaten, bst_total + candidates[i][1])
+                chosen.pop()
 
-    return [pokemon.name for pokemon in pok_sorted][:6], top_types
+    search([], set(), 0)
+    return sorted(best['team'], key=lambda i: -candidates[i][1])
 
 
 if __name__ == '__main__':
@@ -1,9 +1,12 @@
 import csv
+import compiled_data
 
 def read_effectiveness(file_path):
     """
     Reads a Pokémon type effectiveness CSV file and stores it into a 2D array.
 
+    The compiled form of the file (see compiled_data) is used when it is up to date.
+
     Args:
         file_path (str): Path to the downloaded CSV file.
 
@@ -11,7 +14,18 @@ def read_effectiveness(file_path):
         tuple: Contains:
             - types (list): List of type names (e.g., ['Normal', 'Fire', ...]).
             - effectiveness (list of lists): 2D array where effectiveness[i][j] is the
-              effectiveness of attacking type types[i] against defending type types[j].
+              effectiveness of attacking type types[i] against defending type types[j]
+              (from the compiled form, a read-only numpy array mapped from the file).
+    """
+    compiled = compiled_data.load_chart(file_path)
+    if compiled is not None:
+        return compiled
+    return read_csv_effectiveness(file_path)
+
+
+def read_csv_effectiveness(file_path):
+    """
+    Reads the type effectiveness CSV file itself, see read_effectiveness.
     """
     with open(file_path, 'r') as file:
         reader = csv.reader(file)
@@ -20,6 +34,8 @@ def read_effectiveness(file_path):
 
         effectiveness = []
         for row in reader:
+            if not row:
+                continue  # skip blank lines such as a trailing newline
             values = row[1:]  # Skip the attacking type name in the first column
             effectiveness.append([float(val) for val in values])  # Convert values to floats
 
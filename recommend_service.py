@@ -0,0 +1,346 @@
+"""a local HTTP/JSON service for the optimizer, for tools that should not import pygame
+
+    python recommend_service.py --port 8080 --workers 4
+
+Endpoints (every body is JSON):
+    POST /top_types     {"enemy_types": ["Water", ["Ground", "Fighting"]], "top_x": 2, "assignment": "greedy"}
+    POST /user_pokemon  {"team": ["Psyduck", 60], "assignment": "greedy"}   (or "optimal", or "exact")
+    GET  /metrics       request counts, latency percentiles, throughput and cache statistics
+    GET  /health        {"status": "ok"}
+
+POST /top_types wraps recommend_top_types and POST /user_pokemon wraps get_user_pokemon. Either
+takes a batch as {"batch": [item, ...]}, which is answered with {"results": [result, ...]}. An item
+that cannot be answered gets {"error": reason} instead, with "status": 500 added if the service
+failed rather than the request; a single item is answered with status 400 or that status.
+Results are cached, and cache misses are computed by a pool of worker processes that each load the
+chart and dex once. The service only listens on loopback addresses.
+"""
+import argparse
+import ipaddress
+import json
+import math
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+from graph_algorithm import recommend_top_types, cached_matrix_builder, candidate_count
+from pokemon_final_team import get_user_pokemon, get_pokemon
+from batch_recommend import resolve_team, warm_worker
+from result_cache import LRUCache
+
+ENDPOINTS = ("top_types", "user_pokemon")
+# the assignment choices of each endpoint; "exact" searches the whole dex, see best_counter_team
+ASSIGNMENTS = {"top_types": ("greedy", "optimal"), "user_pokemon": ("greedy", "optimal", "exact")}
+
+
+def parse_typing(typing: Any, file_types: str) -> str | tuple[str, str]:
+    """Return typing as recommend_top_types expects it: a type name, or a tuple for a dual typing
+
+    Raises ValueError if typing is not a type, or a list of two different types, in the chart.
+    """
+    if isinstance(typing, list) and len(typing) in (1, 2) and all(isinstance(name, str) for name in typing):
+        typing = typing[0] if len(typing) == 1 else tuple(typing)
+    elif not isinstance(typing, str):
+        raise ValueError(f"a typing must be a type name or a list of two type names, not {json.dumps(typing)}")
+    matrix = cached_matrix_builder(file_types)
+    for name in (typing,) if isinstance(typing, str) else typing:
+        if name not in matrix.index:
+            raise ValueError(f"unknown type: {name}")
+    if typing not in matrix.typing_index:
+        raise ValueError(f"a dual typing needs two different types, not {list(typing)}")
+    return typing
+
+
+def check_top_x(enemy_types: list, top_x: int, file_types: str) -> None:
+    """Raise ValueError unless recommend_top_types can hand top_x recommended types to enemy_types
+
+    Every enemy needs a recommended type, so top_x is at least the number of enemies. It can only be
+    more when there are no more candidate typings than enemies, since every extra one would be left
+    without an enemy.
+    """
+    if top_x < len(enemy_types):
+        raise ValueError(f"top_x must be at least the number of enemy types ({len(enemy_types)})")
+    candidates = candidate_count(enemy_types, file_types)
+    if top_x > len(enemy_types) and candidates > len(enemy_types):
+        raise ValueError(f"top_x can only be more than the number of enemy types ({len(enemy_types)}) when "
+                         f"there are no more candidate typings than that, and this team has {candidates}")
+
+
+def run_item(endpoint: str, item: Any, file_pokemon: str, file_types: str) -> dict:
+    """Return the result of one request item, or {"error": reason} if it is invalid"""
+    if not isinstance(item, dict):
+        return {"error": "a request item must be a JSON object"}
+    assignment = item.get("assignment", "greedy")
+    if assignment not in ASSIGNMENTS[endpoint]:
+        return {"error": f"assignment must be one of {', '.join(ASSIGNMENTS[endpoint])}"}
+    try:
+        if endpoint == "top_types":
+            enemy_types = item.get("enemy_types")
+            if not isinstance(enemy_types, list) or not enemy_types:
+                raise ValueError("enemy_types must be a non-empty list")
+            top_x = item.get("top_x")
+            if top_x is not None and (not isinstance(top_x, int) or isinstance(top_x, bool) or top_x < 1):
+                raise ValueError("top_x must be a positive integer")
+            enemy_types = [parse_typing(typing, file_types) for typing in enemy_types]
+            if top_x is not None and assignment == "greedy":
+                check_top_x(enemy_types, top_x, file_types)
+            matchups = recommend_top_types(enemy_types, file_types, top_x, assignment)
+            return {"matchups": [{"user_type": user_type, "enemy_type": enemy_type}
+                                 for user_type, enemy_type in matchups]}
+        enemies = get_pokemon(resolve_team(item.get("team"), file_pokemon), file_pokemon)
+        user_team, matchups = get_user_pokemon(enemies, file_pokemon, file_types, assignment)
+        return {"user_team": user_team,
+                "matchups": [{"user_type": user_type, "enemy_type": enemy_type} for user_type, enemy_type in matchups]}
+    except ValueError as error:
+        return {"error": str(error)}
+    except Exception as error:  # pylint: disable=broad-except
+        # one failing item should not take the rest of its batch, or the connection, down with it
+        return {"error": f"internal error: {type(error).__name__}: {error}", "status": 500}
+
+
+def run_items(endpoint: str, items: list, file_pokemon: str, file_types: str) -> list[dict]:
+    """Return the results of several request items (run in a worker process)"""
+    return [run_item(endpoint, item, file_pokemon, file_types) for item in items]
+
+
+class ServiceMetrics:
+    """
+    Request counts and latencies of the service.
+
+    Instance Attributes:
+        - started: the time.monotonic() the service started at
+        - requests: the number of requests answered, per endpoint
+        - items: the number of items computed or served from the cache, per endpoint
+        - errors: the number of requests answered with an error status
+        - latencies: the (time finished, seconds taken) of the most recent requests
+    """
+    started: float
+    requests: dict[str, int]
+    items: dict[str, int]
+    errors: int
+    latencies: deque
+    _lock: threading.Lock
+
+    def __init__(self, window: int = 10000) -> None:
+        self.started = time.monotonic()
+        self.requests = {}
+        self.items = {}
+        self.errors = 0
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, items: int = 0, error: bool = False) -> None:
+        """Record one answered request"""
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.items[endpoint] = self.items.get(endpoint, 0) + items
+            self.errors += error
+            self.latencies.append((time.monotonic(), seconds))
+
+    def snapshot(self, recent: float = 60.0) -> dict[str, Any]:
+        """Return the totals, the throughput overall and over the last recent seconds, and latency percentiles"""
+        with self._lock:
+            now = time.monotonic()
+            uptime = now - self.started
+            latencies = sorted(seconds for _, seconds in self.latencies)
+            recent_count = sum(1 for finished, _ in self.latencies if now - finished <= recent)
+            total = sum(self.requests.values())
+            return {
+                "uptime_s": uptime,
+                "requests": dict(self.requests),
+                "items": dict(self.items),
+                "errors": self.errors,
+                "throughput_rps": total / uptime if uptime > 0 else 0.0,
+                "recent_throughput_rps": recent_count / min(recent, uptime) if uptime > 0 else 0.0,
+                "latency_ms": {name: _percentile(latencies, q) * 1000
+                               for name, q in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))},
+            }
+
+
+def _percentile(values: list[float], q: float) -> float:
+    """Return the q-th percentile of the sorted values by the nearest rank, or 0.0 if there are none"""
+    if not values:
+        return 0.0
+    return values[max(math.ceil(q / 100 * len(values)) - 1, 0)]
+
+
+class RecommendationService:
+    """
+    Answers requests from cached results or a pool of warm workers.
+
+    Instance Attributes:
+        - file_pokemon: the Pokemon data file
+        - file_types: the type chart file
+        - workers: the number of worker processes, or 0 to compute in the server process
+        - cache: results of single items, keyed by endpoint and the item's JSON
+        - metrics: request counts and latencies
+    """
+    file_pokemon: str
+    file_types: str
+    workers: int
+    cache: LRUCache
+    metrics: ServiceMetrics
+    _executor: Executor
+
+    def __init__(self, file_pokemon: str = 'pokemon_data.csv', file_types: str = 'chart.csv',
+                 workers: Optional[int] = None, cache_size: int = 4096, cache_ttl: Optional[float] = None) -> None:
+        self.file_pokemon = file_pokemon
+        self.file_types = file_types
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self.metrics = ServiceMetrics()
+        warm_worker(file_pokemon, file_types)
+        if self.workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_worker,
+                                                 initargs=(file_pokemon, file_types))
+            # start every worker now so the first requests do not wait for them to load
+            for future in [self._executor.submit(warm_worker, file_pokemon, file_types)
+                           for _ in range(self.workers)]:
+                future.result()
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def compute(self, endpoint: str, items: list) -> list[dict]:
+        """Return the results of items, computing the ones not cached in chunks spread over the workers"""
+        keys = [(endpoint, json.dumps(item, sort_keys=True)) for item in items]
+        results = [self.cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            chunk_size = math.ceil(len(missing) / max(self.workers, 1))
+            chunks = [missing[start:start + chunk_size] for start in range(0, len(missing), chunk_size)]
+            futures = [self._executor.submit(run_items, endpoint, [items[i] for i in chunk],
+                                             self.file_pokemon, self.file_types) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                try:
+                    chunk_results = future.result()
+                except Exception as error:  # pylint: disable=broad-except
+                    # e.g. a worker process died; answer its items instead of dropping the request
+                    chunk_results = [{"error": f"internal error: {type(error).__name__}: {error}", "status": 500}
+                                     for _ in chunk]
+                for i, result in zip(chunk, chunk_results):
+                    results[i] = result
+                    if "error" not in result:
+                        self.cache.put(keys[i], result)
+        return results
+
+    def handle(self, method: str, path: str, body: bytes) -> tuple[int, dict]:
+        """Return the status code and JSON response for a request"""
+        endpoint = path.strip("/").split("?")[0]
+        if method == "GET" and endpoint == "health":
+            return 200, {"status": "ok"}
+        if method == "GET" and endpoint == "metrics":
+            return 200, {**self.metrics.snapshot(), "cache": self.cache.info(), "workers": self.workers}
+        if endpoint not in ENDPOINTS:
+            return 404, {"error": f"unknown endpoint: {path}"}
+        if method != "POST":
+            return 405, {"error": f"{path} only accepts POST"}
+        try:
+            payload = json.loads(body or b"null")
+        except ValueError as error:
+            return 400, {"error": f"invalid JSON: {error}"}
+        if isinstance(payload, dict) and "batch" in payload:
+            if not isinstance(payload["batch"], list):
+                return 400, {"error": "batch must be a list"}
+            return 200, {"results": self.compute(endpoint, payload["batch"])}
+        result = self.compute(endpoint, [payload])[0]
+        if "error" in result:
+            return result.pop("status", 400), result
+        return 200, result
+
+    def close(self) -> None:
+        """Stop the workers"""
+        self._executor.shutdown(cancel_futures=True)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """Passes requests to the RecommendationService of the server and writes its JSON responses"""
+    server: 'ServiceServer'
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        """Answer a GET request"""
+        self.respond("GET")
+
+    def do_POST(self) -> None:
+        """Answer a POST request"""
+        self.respond("POST")
+
+    def respond(self, method: str) -> None:
+        """Answer a request and record it in the metrics"""
+        start = time.perf_counter()
+        try:
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            status, response = self.server.service.handle(method, self.path, body)
+        except Exception as error:  # pylint: disable=broad-except
+            status, response = 500, {"error": f"internal error: {type(error).__name__}: {error}"}
+        content = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        endpoint = self.path.strip("/").split("?")[0]
+        if endpoint in ENDPOINTS:
+            items = len(response["results"]) if "results" in response else 1
+            self.server.service.metrics.record(endpoint, time.perf_counter() - start, items, status >= 400)
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+        """Only log requests when the server is verbose"""
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ServiceServer(ThreadingHTTPServer):
+    """
+    An HTTP server for a RecommendationService that refuses to listen on anything but loopback.
+
+    Instance Attributes:
+        - service: the service answering requests
+        - verbose: whether every request is logged to stderr
+    """
+    service: RecommendationService
+    verbose: bool
+    daemon_threads = True
+
+    def __init__(self, service: RecommendationService, host: str = "127.0.0.1", port: int = 8080,
+                 verbose: bool = False) -> None:
+        if not ipaddress.ip_address(socket.gethostbyname(host)).is_loopback:
+            raise ValueError(f"the service only listens on localhost, not {host}")
+        self.service = service
+        self.verbose = verbose
+        super().__init__((host, port), ServiceHandler)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Run the service until interrupted"""
+    parser = argparse.ArgumentParser(description="Serve the optimizer over HTTP/JSON on localhost.")
+    parser.add_argument("--host", default="127.0.0.1", help="loopback address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on (0 picks a free one)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per cpu, 0 computes in the server process)")
+    parser.add_argument("--cache-size", type=int, default=4096, help="results kept in the cache")
+    parser.add_argument("--cache-ttl", type=float, default=None, help="seconds a cached result stays valid")
+    parser.add_argument("--pokemon", default="pokemon_data.csv", help="Pokemon data file")
+    parser.add_argument("--chart", default="chart.csv", help="type chart file")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    service = RecommendationService(args.pokemon, args.chart, args.workers, args.cache_size, args.cache_ttl)
+    server = ServiceServer(service, args.host, args.port, args.verbose)
+    print(f"serving on http://{server.server_address[0]}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""bounded caches shared by the recommendation pipeline
+
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import instrumentation
+
+
+def file_stamp(file_path: str) -> tuple[str, int, int]:
+    """return the resolved path, modification time and size of file_path, which change when the file does
+    """
+    path = os.path.realpath(file_path)
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+class LRUCache:
+    """
+    A thread safe least recently used cache with an optional time to live.
+
+    Instance Attributes:
+        - maxsize: the most entries kept before the least recently used one is evicted (0 disables the cache)
+        - ttl: the number of seconds an entry stays valid, or None to keep entries until they are evicted
+        - hits: the number of lookups that found a valid entry
+        - misses: the number of lookups that found nothing or an expired entry
+
+    Representation Invariants:
+        - self.maxsize >= 0
+        - self.ttl is None or self.ttl > 0
+    """
+    maxsize: int
+    ttl: Optional[float]
+    hits: int
+    misses: int
+    _entries: OrderedDict
+    _lock: threading.Lock
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value stored for key, or default if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or time.monotonic() - entry[0] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store value for key, evicting the least recently used entries beyond maxsize."""
+        with self._lock:
+            if self.maxsize <= 0:
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def configure(self, maxsize: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        """Change the size limit and/or time to live, evicting entries that no longer fit."""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl if ttl > 0 else None
+            while len(self._entries) > max(self.maxsize, 0):
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every entry and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> dict[str, Any]:
+        """Return the hit and miss counts, hit rate and current size of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'size': len(self._entries), 'maxsize': self.maxsize, 'ttl': self.ttl}
+
+
+class FileCache:
+    """
+    A thread safe cache of values built from files, holding one value per file.
+
+    Each entry is tagged with the modification time and size of the file it was built from. A lookup
+    that finds the file changed builds the value again and replaces the entry, so older versions of a
+    file are never kept.
+
+    Instance Attributes:
+        - build: the function building the value of a file from its resolved path
+        - counter: the instrumentation counter prefix for hits and misses (e.g. 'chart cache'), or None
+        - hits: the number of lookups that found the value of the file's current version
+        - misses: the number of lookups that had to build the value
+    """
+    build: Callable[[str], Any]
+    counter: Optional[str]
+    hits: int
+    misses: int
+    _entries: dict
+    _lock: threading.Lock
+
+    def __init__(self, build: Callable[[str], Any], counter: Optional[str] = None) -> None:
+        self.build = build
+        self.counter = counter
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, file_path: str, stamp: Optional[tuple[str, int, int]] = None) -> Any:
+        """Return the value built from the current version of file_path, building it if needed.
+
+        stamp is the file_stamp of file_path, if the caller already has it.
+        """
+        path, mtime, size = stamp or file_stamp(file_path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == (mtime, size):
+                self.hits += 1
+                if self.counter is not None:
+                    instrumentation.count(self.counter + ' hits')
+                return entry[1]
+            self.misses += 1
+            if self.counter is not None:
+                instrumentation.count(self.counter + ' misses')
+            value = self.build(path)
+            self._entries[path] = ((mtime, size), value)
+            return value
+
+    def clear(self) -> None:
+        """Drop every entry and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> dict[str, Any]:
+        """Return the hit and miss counts and the number of files cached."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
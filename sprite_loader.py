@@ -0,0 +1,268 @@
+"""concurrent sprite downloads for the game
+
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional, TYPE_CHECKING
+
+import instrumentation
+
+if TYPE_CHECKING:
+    import requests
+
+BASE_URL = "https://img.pokemondb.net/sprites/"
+ADD_ONS = ("scarlet-violet/normal/1x/", "x-y/normal/", "sun-moon/normal/1x/", "sword-shield/normal/", "home/normal/1x/")
+CACHE_DIR = "sprite_cache"
+INDEX_FILE = "index.json"
+# fetch_variants' statuses for a variant that came back 404, and one that failed any other way
+MISSING, FAILED = "missing", "failed"
+
+
+class SpriteCache:
+    """
+    Downloaded sprites kept on disk between runs, plus which url variant each name resolved to.
+
+    Sprites are stored as downloaded and the least recently used ones are deleted once the cache grows
+    past max_bytes. Variants that came back 404 are remembered for missing_ttl seconds so they are not
+    requested again.
+
+    Instance Attributes:
+        - directory: the folder holding the sprites and the index file
+        - max_bytes: the most bytes of sprites kept on disk
+        - missing_ttl: the number of seconds a 404 is remembered for
+    """
+    directory: str
+    max_bytes: int
+    missing_ttl: float
+    _index: dict
+    _dirty: bool
+    _lock: threading.Lock
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = 20 * 1024 * 1024,
+                 missing_ttl: float = 7 * 24 * 60 * 60) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.missing_ttl = missing_ttl
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(os.path.join(directory, INDEX_FILE)) as file:
+                self._index = json.load(file)
+        except (OSError, ValueError):
+            self._index = {}
+        self._index.setdefault("sprites", {})
+        self._index.setdefault("missing", {})
+
+    def _path(self, formatted_name: str) -> str:
+        """Return the file a sprite is stored in (hashed, since names may hold characters paths cannot)."""
+        return os.path.join(self.directory, hashlib.sha1(formatted_name.encode()).hexdigest() + ".png")
+
+    def get(self, formatted_name: str) -> Optional[tuple[str, bytes]]:
+        """Return the add_on and image bytes cached for a name, or None if it is not cached."""
+        with self._lock:
+            entry = self._index["sprites"].get(formatted_name)
+            if entry is None:
+                return None
+            try:
+                with open(self._path(formatted_name), "rb") as file:
+                    content = file.read()
+            except OSError:
+                del self._index["sprites"][formatted_name]
+                self._dirty = True
+                return None
+            entry["used"] = time.time()
+            self._dirty = True
+            return entry["add_on"], content
+
+    def put(self, formatted_name: str, add_on: str, content: bytes) -> None:
+        """Store the sprite found for a name, evicting the least recently used sprites over max_bytes."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(formatted_name), "wb") as file:
+                file.write(content)
+            sprites = self._index["sprites"]
+            sprites[formatted_name] = {"add_on": add_on, "size": len(content), "used": time.time()}
+            total = sum(entry["size"] for entry in sprites.values())
+            for name in sorted(sprites, key=lambda other: sprites[other]["used"]):
+                if total <= self.max_bytes:
+                    break
+                total -= sprites.pop(name)["size"]
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+            self._dirty = True
+
+    def known_missing(self, formatted_name: str) -> set[str]:
+        """Return the add_ons that recently came back 404 for a name."""
+        with self._lock:
+            now = time.time()
+            return {add_on for add_on, when in self._index["missing"].get(formatted_name, {}).items()
+                    if now - when < self.missing_ttl}
+
+    def mark_missing(self, formatted_name: str, add_on: str) -> None:
+        """Remember that a variant of a name came back 404."""
+        with self._lock:
+            self._index["missing"].setdefault(formatted_name, {})[add_on] = time.time()
+            self._dirty = True
+
+    def save(self) -> None:
+        """Write the index to disk if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = os.path.join(self.directory, INDEX_FILE + ".tmp")
+            with open(temp_path, "w") as file:
+                json.dump(self._index, file)
+            os.replace(temp_path, os.path.join(self.directory, INDEX_FILE))
+            self._dirty = False
+
+
+class SpriteFetcher:
+    """
+    Downloads sprite images over one keep-alive session, trying every url variant of every name at once.
+
+    Instance Attributes:
+        - base_url: the url every sprite url starts with (point it at a local server to test)
+        - add_ons: the url variants to try for each name, most preferred first
+        - timeout: the number of seconds to wait for a single response
+        - session: the shared http session, so connections are reused between downloads (opened on first use)
+        - cache: the on-disk cache consulted before going to the network, if any
+    """
+    base_url: str
+    add_ons: tuple[str, ...]
+    timeout: float
+    session: Optional[requests.Session]
+    cache: Optional[SpriteCache]
+    _max_workers: int
+    _session_lock: threading.Lock
+    _executor: ThreadPoolExecutor
+
+    def __init__(self, base_url: str = BASE_URL, add_ons: tuple[str, ...] = ADD_ONS, max_workers: int = 16,
+                 timeout: float = 10.0, session: Optional[requests.Session] = None,
+                 cache: Optional[SpriteCache] = None) -> None:
+        self.base_url = base_url
+        self.add_ons = add_ons
+        self.timeout = timeout
+        self.cache = cache
+        self.session = session
+        self._max_workers = max_workers
+        self._session_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sprite")
+
+    def url(self, add_on: str, formatted_name: str) -> str:
+        """Return the url of one variant of a sprite."""
+        return self.base_url + add_on + formatted_name + ".png"
+
+    def get_session(self) -> requests.Session:
+        """Return the shared session, importing requests and opening it the first time a sprite is downloaded."""
+        with self._session_lock:
+            if self.session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                self.session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self._max_workers, pool_maxsize=self._max_workers)
+                self.session.mount("http://", adapter)
+                self.session.mount("https://", adapter)
+            return self.session
+
+    def fetch(self, url: str) -> Optional[bytes]:
+        """Return the body of url, or None if it is missing or cannot be reached."""
+        return self._fetch_status(url)[1]
+
+    def _fetch_status(self, url: str) -> tuple[Optional[int], Optional[bytes]]:
+        """Return the status code (None if the server cannot be reached) and, on success, the body of url."""
+        session = self.get_session()
+        import requests  # already imported by get_session
+
+        try:
+            response = session.get(url, timeout=self.timeout)
+        except requests.RequestException:
+            return None, None
+        if response.status_code == 200:
+            return 200, response.content
+        return response.status_code, None
+
+    @instrumentation.timed
+    def fetch_variants(self, formatted_names: list[str]) -> dict[str, Optional[tuple[str, bytes]]]:
+        """Return, for each formatted name, the add_on and image bytes of its most preferred variant that exists.
+
+        Cached names are answered from disk. For the rest, every variant not known to be missing is
+        requested concurrently. A name is settled as soon as a variant succeeds and all variants
+        preferred over it have failed, and its less preferred requests that have not started yet are
+        cancelled. The call returns once every name is settled, without waiting for requests still
+        running. Names with no variant map to None.
+
+        Only a 404 counts as a variant that does not exist. A sprite found after a preferred variant
+        timed out or could not be reached is returned but not cached, so the next call tries again.
+        """
+        results = {}
+        statuses = {}
+        for name in formatted_names:
+            cached = self.cache.get(name) if self.cache else None
+            if cached is not None:
+                instrumentation.count('sprite cache hits')
+                results[name] = cached
+                continue
+            missing = self.cache.known_missing(name) if self.cache else set()
+            statuses[name] = [MISSING if add_on in missing else None for add_on in self.add_ons]
+            if _first_success(statuses[name]) == -1:
+                results[name] = None
+
+        futures = {}
+        for name, name_statuses in statuses.items():
+            for i, add_on in enumerate(self.add_ons):
+                if name_statuses[i] is None:
+                    futures[self._executor.submit(self._fetch_status, self.url(add_on, name))] = (name, i)
+        pending = {name: [future for future, key in futures.items() if key[0] == name] for name in statuses}
+
+        waiting = {future for future, (name, _) in futures.items() if name not in results}
+        while waiting:
+            done, waiting = wait(waiting, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, i = futures[future]
+                if future.cancelled() or name in results:
+                    continue
+                instrumentation.count('HTTP fetches')
+                status_code, content = future.result()
+                statuses[name][i] = content if content is not None else MISSING if status_code == 404 else FAILED
+                if status_code == 404 and self.cache:
+                    self.cache.mark_missing(name, self.add_ons[i])
+                settled = _first_success(statuses[name])
+                if settled is not None:
+                    results[name] = (self.add_ons[settled], statuses[name][settled]) if settled >= 0 else None
+                    if settled >= 0 and self.cache and FAILED not in statuses[name][:settled]:
+                        self.cache.put(name, *results[name])
+                    for other in pending[name]:
+                        other.cancel()
+            waiting = {future for future in waiting if futures[future][0] not in results}
+        if self.cache:
+            self.cache.save()
+        return {name: results.get(name) for name in formatted_names}
+
+    def close(self) -> None:
+        """Stop the worker threads and close the session."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.session is not None:
+            self.session.close()
+
+
+def _first_success(statuses: list) -> Optional[int]:
+    """Return the index of the first success in statuses, -1 if every variant failed, or None if undecided.
+
+    statuses holds None for a pending request, MISSING or FAILED for a failed one and the content for a success.
+    """
+    for i, status in enumerate(statuses):
+        if status is None:
+            return None
+        if isinstance(status, bytes):
+            return i
+    return -1
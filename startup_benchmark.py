@@ -0,0 +1,69 @@
+"""measure how long the game takes to start
+
+Each run starts a fresh interpreter, so imports and data loading are measured cold. Run with
+python startup_benchmark.py [--runs N] [--json FILE]; set SDL_VIDEODRIVER=dummy to run without a window.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+STAGES = ("import", "data_load", "first_frame", "total")
+
+
+def measure_startup() -> dict[str, float]:
+    """Return the seconds spent importing main, loading the Pokédex and drawing the first frame in this process
+
+    Preconditions:
+        - main has not been imported yet in this process
+    """
+    start = time.perf_counter()
+    import main  # pylint: disable=import-outside-toplevel
+    imported = time.perf_counter()
+    main.load_pokedex("pokemon_data.csv")
+    loaded = time.perf_counter()
+    game = main.Game()
+    game.draw_frame()
+    drawn = time.perf_counter()
+    game.running = False
+    game.worker.shutdown(wait=False, cancel_futures=True)
+    return {"import": imported - start, "data_load": loaded - imported, "first_frame": drawn - loaded,
+            "total": drawn - start}
+
+
+def run_cold(runs: int) -> list[dict[str, float]]:
+    """Return the startup times of runs fresh interpreters"""
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, __file__, "--child"], capture_output=True, text=True, check=True)
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def summarize(results: list[dict[str, float]]) -> dict[str, dict[str, float]]:
+    """Return the median, minimum and maximum of every stage in milliseconds"""
+    return {stage: {"median_ms": statistics.median(r[stage] for r in results) * 1000,
+                    "min_ms": min(r[stage] for r in results) * 1000,
+                    "max_ms": max(r[stage] for r in results) * 1000}
+            for stage in STAGES}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cold start time of the game.")
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh interpreters to time")
+    parser.add_argument("--json", help="also write the summary to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_startup()))
+    else:
+        summary = summarize(run_cold(args.runs))
+        for name, times in summary.items():
+            print(f"{name:<12} median {times['median_ms']:8.1f} ms   "
+                  f"min {times['min_ms']:8.1f} ms   max {times['max_ms']:8.1f} ms")
+        if args.json:
+            with open(args.json, "w") as file:
+                json.dump({"runs": args.runs, "python": sys.version.split()[0], "stages": summary}, file, indent=2)
@@ -0,0 +1,62 @@
+"""tests best_counter_team against a brute force search over every team of a reduced dex
+
+    python -m pytest test_best_counter_team.py
+"""
+import csv
+import itertools
+import random
+
+import pytest
+
+from graph_algorithm import cached_matrix_builder, candidate_score_table
+from pokemon_final_team import best_counter_team, get_pokemon, get_pokemon_table, get_types
+
+SIZE = 4
+
+
+@pytest.fixture(scope="module")
+def reduced_dex(tmp_path_factory):
+    """Write 18 Pokemon of the dex, with distinct names, to a csv of their own"""
+    with open("pokemon_data.csv") as file:
+        header, *rows = list(csv.reader(file))
+    by_name = {row[1]: row for row in rows if row}
+    picked = random.Random(7).sample(sorted(by_name), 18)
+    path = tmp_path_factory.mktemp("dex") / "reduced.csv"
+    with open(path, "w", newline="") as file:
+        csv.writer(file).writerows([header] + [by_name[name] for name in picked])
+    return str(path)
+
+
+def brute_force(enemy_team, file_pokemon):
+    """Return the best (score, total bst) of every team of SIZE Pokemon in file_pokemon"""
+    matrix = cached_matrix_builder("chart.csv")
+    scores = candidate_score_table(matrix)
+    enemy_rows = list(dict.fromkeys(matrix.typing_row(enemy) for enemy in get_types(enemy_team)))
+    table = get_pokemon_table(file_pokemon)
+    members = [(matrix.typing_row(table.typing_of(position)), int(table.bst[position]))
+               for position in range(len(table))]
+    return max(team_key(team, enemy_rows, scores) for team in itertools.combinations(members, SIZE))
+
+
+def team_key(team, enemy_rows, scores):
+    """Return the score and total bst of a team of (typing row, bst) members"""
+    score = sum(max(scores[typing_row, enemy] for typing_row, _ in team) for enemy in enemy_rows)
+    return score, sum(bst for _, bst in team)
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_best_counter_team_matches_brute_force(reduced_dex, seed) -> None:
+    """The team found scores, and on ties totals, as high as the best of every possible team"""
+    rng = random.Random(seed)
+    enemy_ids = rng.sample(sorted(set(get_pokemon_table().ids.tolist())), rng.randint(1, SIZE))
+    enemy_team = get_pokemon(enemy_ids)
+    names, matchups = best_counter_team(enemy_team, reduced_dex, size=SIZE)
+
+    matrix = cached_matrix_builder("chart.csv")
+    table = get_pokemon_table(reduced_dex)
+    positions = {name: position for position, name in enumerate(table.names)}
+    team = [(matrix.typing_row(table.typing_of(positions[name])), int(table.bst[positions[name]])) for name in names]
+    enemy_rows = list(dict.fromkeys(matrix.typing_row(enemy) for enemy in get_types(enemy_team)))
+    assert len(set(names)) == SIZE
+    assert team_key(team, enemy_rows, candidate_score_table(matrix)) == brute_force(enemy_team, reduced_dex)
+    assert [enemy for _, enemy in matchups] == list(get_types(enemy_team))
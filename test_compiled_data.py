@@ -0,0 +1,82 @@
+"""tests that compiled data files load back exactly as the csv files they were compiled from
+
+    python -m pytest test_compiled_data.py
+"""
+import csv
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import compiled_data
+from pokemon_class import PokemonTable
+from pokemon_data_scraper import process_row
+from pokemon_type_data_scraper import read_csv_effectiveness
+
+
+@pytest.fixture
+def sources(tmp_path):
+    """Copy the dex and type chart into a folder of their own, so compiling them leaves the repo alone"""
+    shutil.copy("pokemon_data.csv", tmp_path / "pokemon_data.csv")
+    shutil.copy("chart.csv", tmp_path / "chart.csv")
+    return str(tmp_path / "pokemon_data.csv"), str(tmp_path / "chart.csv")
+
+
+def csv_rows(path):
+    """Return the rows of a Pokemon data csv as load_pokedex makes them without a compiled file"""
+    with open(path) as file:
+        reader = csv.reader(file)
+        next(reader)
+        return [process_row(row) for row in reader if row]
+
+
+def test_pokedex_round_trip(sources) -> None:
+    """The compiled dex gives the csv's rows, and a PokemonTable equal to one built from them"""
+    dex, _ = sources
+    assert compiled_data.load_pokedex_rows(dex) is None
+    compiled_data.compile_pokedex(dex)
+    rows = csv_rows(dex)
+    assert compiled_data.load_pokedex_rows(dex) == rows
+
+    table, expected = compiled_data.load_pokemon_table(dex), PokemonTable(rows)
+    for column in ("ids", "type1", "type2", "stats", "bst"):
+        assert np.array_equal(getattr(table, column), getattr(expected, column))
+    assert (table.names, table.type_names, table.positions) == (expected.names, expected.type_names,
+                                                                expected.positions)
+    assert table[0].name == expected[0].name and table[0].stats == expected[0].stats
+
+
+def test_chart_round_trip(sources) -> None:
+    """The compiled chart gives the csv's types and multipliers"""
+    _, chart = sources
+    compiled_data.compile_chart(chart)
+    types, effectiveness = compiled_data.load_chart(chart)
+    assert (types, effectiveness.tolist()) == read_csv_effectiveness(chart)
+
+
+def test_changed_csv_is_not_loaded_from_its_compiled_file(sources) -> None:
+    """Editing the csv makes its compiled file out of date"""
+    _, chart = sources
+    compiled_data.compile_chart(chart)
+    with open(chart) as file:
+        text = file.read()
+    with open(chart, "w") as file:
+        file.write(text.replace("Normal,1,", "Normal,2,", 1))
+    assert compiled_data.load_chart(chart) is None
+
+
+def test_touched_csv_is_restamped_only_when_compiling(sources) -> None:
+    """A csv with a new mtime but the same contents still loads, and only restamp rewrites the compiled file"""
+    dex, _ = sources
+    path = compiled_data.compile_pokedex(dex)
+    os.utime(dex, ns=(1, 1))
+    with open(path, "rb") as file:
+        before = file.read()
+    assert compiled_data.load_pokedex_rows(dex) == csv_rows(dex)
+    with open(path, "rb") as file:
+        assert file.read() == before
+
+    assert compiled_data.restamp(dex) == path
+    with open(path, "rb") as file:
+        assert compiled_data.HEADER.unpack(file.read(compiled_data.HEADER.size))[-2] == 1
@@ -0,0 +1,55 @@
+"""tests that recommend_many answers exactly as one recommend_top_types call per team
+
+    python -m pytest test_recommend_many.py
+"""
+import random
+
+import pytest
+
+from graph_algorithm import RECOMMENDATION_CACHE, cached_matrix_builder, recommend_many, recommend_top_types
+
+
+def random_teams(count, seed=0):
+    """Return count seeded teams of 1 to 6 typings, some of them repeated dual types like ('Water', 'Water')"""
+    rng = random.Random(seed)
+    types = list(cached_matrix_builder("chart.csv").types)
+    teams = []
+    for _ in range(count):
+        team = []
+        for _ in range(rng.randint(1, 6)):
+            kind = rng.random()
+            if kind < 0.45:
+                team.append(rng.choice(types))
+            elif kind < 0.95:
+                team.append(tuple(rng.sample(types, 2)))
+            else:
+                team.append((rng.choice(types),) * 2)
+        teams.append(team)
+    return teams
+
+
+@pytest.mark.parametrize("sized", [False, True])
+def test_recommend_many_matches_per_team_calls(sized) -> None:
+    """Batched recommendations equal per-team ones, with top_x left out or set to the team size"""
+    teams = random_teams(300)
+    if sized:
+        for size in range(1, 7):
+            same_size = [team for team in teams if len(team) == size]
+            assert recommend_many(same_size, top_x=size) == [recommend_top_types(team, top_x=size)
+                                                             for team in same_size]
+    else:
+        expected = [recommend_top_types(team) for team in teams]
+        assert recommend_many(teams) == expected
+
+
+def test_recommend_many_in_worker_processes(tmp_path) -> None:
+    """Chunks scored in a process pool come back in order, reading the chart given rather than chart.csv"""
+    with open("chart.csv") as file:
+        header, _, *rows = file.read().splitlines()
+    chart = tmp_path / "strong_normal.csv"  # a chart where Normal hits everything super effectively
+    chart.write_text("\n".join([header, "Normal" + ",2" * (len(rows) + 1)] + rows) + "\n")
+    teams = random_teams(120, seed=1)
+    RECOMMENDATION_CACHE.clear()
+    expected = [recommend_top_types(team, str(chart)) for team in teams]
+    assert expected != [recommend_top_types(team) for team in teams]
+    assert recommend_many(teams, str(chart), workers=2, chunk_size=25) == expected
@@ -0,0 +1,72 @@
+"""tests solve_assignment and the optimal pairing of recommend_top_types against permutation brute force
+
+    python -m pytest test_solve_assignment.py
+"""
+import itertools
+import random
+
+import pytest
+
+from graph_algorithm import cached_matrix_builder, candidate_score_table, final_type_mask, recommend_top_types, \
+    solve_assignment
+
+
+def best_cost(cost):
+    """Return the lowest total cost of giving every row its own column, trying every choice of columns"""
+    columns = range(len(cost[0]))
+    return min(sum(cost[row][column] for row, column in enumerate(choice))
+               for choice in itertools.permutations(columns, len(cost)))
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_solve_assignment_matches_brute_force(seed) -> None:
+    """The columns are distinct and cost as little as the best of every assignment"""
+    rng = random.Random(seed)
+    rows = rng.randint(1, 5)
+    cols = rng.randint(rows, 7)
+    # quarter steps with many ties, like the matchup scores it is used on
+    cost = [[rng.randint(-8, 8) / 4 for _ in range(cols)] for _ in range(rows)]
+    columns = solve_assignment(cost)
+    assert len(set(columns)) == rows
+    assert sum(cost[row][column] for row, column in enumerate(columns)) == best_cost(cost)
+
+
+def test_solve_assignment_of_nothing() -> None:
+    """No rows need no columns"""
+    assert solve_assignment([]) == []
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_optimal_types_score_as_high_as_any_pairing(seed) -> None:
+    """recommend_top_types(assignment='optimal') scores as high as any pairing of the candidate typings"""
+    matrix = cached_matrix_builder("chart.csv")
+    rng = random.Random(seed)
+    types = list(matrix.types)
+    enemy_team = [rng.choice(types) if rng.random() < 0.5 else tuple(rng.sample(types, 2))
+                  for _ in range(rng.randint(1, 4))]
+    scores = candidate_score_table(matrix)
+    paired = recommend_top_types(enemy_team, assignment='optimal')
+    assert [enemy for _, enemy in paired] == enemy_team
+    assert len({matrix.typing_row(candidate) for candidate, _ in paired}) == len(enemy_team)
+
+    # the typings recommend_optimal_types chooses from
+    kept = matrix.mask_types(final_type_mask(matrix, enemy_team))
+    candidates = kept + list(itertools.combinations(kept, 2))
+    assert len(candidates) >= len(enemy_team)  # so the whole chart is not needed, which would be too many
+    cost = [[-scores[matrix.typing_row(candidate), matrix.typing_row(enemy)] for candidate in candidates]
+            for enemy in enemy_team]
+    total = sum(scores[matrix.typing_row(candidate), matrix.typing_row(enemy)] for candidate, enemy in paired)
+    assert -total == best_cost(cost)
+
+
+def test_repeated_dual_type_is_paired_like_its_single_type() -> None:
+    """('Water', 'Water') gets the same optimal counter as 'Water', not the greedy one"""
+    repeated = recommend_top_types(['Water', ('Water', 'Water'), 'Fire'], assignment='optimal')
+    single = recommend_top_types(['Water', 'Water', 'Fire'], assignment='optimal')
+    assert [candidate for candidate, _ in repeated] == [candidate for candidate, _ in single]
+
+
+def test_unknown_assignment_is_rejected() -> None:
+    """A misspelt assignment raises instead of quietly running greedy"""
+    with pytest.raises(ValueError):
+        recommend_top_types(['Water'], assignment='optimla')
@@ -0,0 +1,76 @@
+"""tests for SpriteCache, on its own and behind SpriteFetcher with the local sprite server in conftest.py
+
+    python -m pytest test_sprite_cache.py
+"""
+import time
+
+import sprite_loader
+from conftest import ADD_ONS
+from sprite_loader import SpriteCache
+
+
+def test_least_recently_used_sprites_are_evicted_over_max_bytes(tmp_path, monkeypatch) -> None:
+    """Once the sprites pass max_bytes, the least recently used ones are deleted until they fit"""
+    clock = iter(range(1000))
+    monkeypatch.setattr(sprite_loader.time, "time", lambda: next(clock))
+    cache = SpriteCache(str(tmp_path), max_bytes=250)
+    cache.put("a", "first/", b"a" * 100)
+    cache.put("b", "first/", b"b" * 100)
+    assert cache.get("a") == ("first/", b"a" * 100)  # a is now used more recently than b
+
+    cache.put("c", "first/", b"c" * 100)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert len(list(tmp_path.glob("*.png"))) == 2
+
+
+def test_missing_variants_are_remembered_for_seven_days(server, tmp_path, monkeypatch) -> None:
+    """Variants that came back 404 are not requested again, across restarts, until missing_ttl passes"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(sprite_loader.time, "time", lambda: now[0])
+    fetcher = server.fetcher(SpriteCache(str(tmp_path)))
+    assert fetcher.fetch_variants(["missingno"]) == {"missingno": None}
+    fetcher.close()
+    assert sorted(server.requested) == [f"/sprites/{add_on}missingno.png" for add_on in ADD_ONS]
+
+    server.requested.clear()
+    now[0] += 7 * 24 * 60 * 60 - 1
+    fetcher = server.fetcher(SpriteCache(str(tmp_path)))
+    assert fetcher.fetch_variants(["missingno"]) == {"missingno": None}
+    fetcher.close()
+    assert server.requested == []
+
+    now[0] += 2
+    fetcher = server.fetcher(SpriteCache(str(tmp_path)))
+    assert fetcher.fetch_variants(["missingno"]) == {"missingno": None}
+    fetcher.close()
+    assert len(server.requested) == len(ADD_ONS)
+
+
+def test_fallback_found_after_a_timeout_is_not_cached(server, tmp_path) -> None:
+    """A timed out preferred variant is neither remembered as missing nor replaced for good by a fallback"""
+    server.serve("first/", "eevee", b"first-png", delay=1.0)
+    server.serve("second/", "eevee", b"second-png")
+    cache = SpriteCache(str(tmp_path))
+    fetcher = server.fetcher(cache, timeout=0.2)
+    assert fetcher.fetch_variants(["eevee"]) == {"eevee": ("second/", b"second-png")}
+    fetcher.close()
+    assert cache.get("eevee") is None
+    assert "first/" not in cache.known_missing("eevee")
+
+    server.serve("first/", "eevee", b"first-png")
+    fetcher = server.fetcher(SpriteCache(str(tmp_path)))
+    assert fetcher.fetch_variants(["eevee"]) == {"eevee": ("first/", b"first-png")}
+    fetcher.close()
+    assert SpriteCache(str(tmp_path)).get("eevee") == ("first/", b"first-png")
+
+
+def test_settled_names_do_not_wait_for_running_requests(server, tmp_path) -> None:
+    """Once the preferred variants have answered, a slow less preferred request is not waited for"""
+    server.serve("second/", "ditto", b"ditto-png")
+    server.serve("third/", "ditto", b"late-png", delay=2.0)
+    fetcher = server.fetcher(SpriteCache(str(tmp_path)))
+    start = time.perf_counter()
+    assert fetcher.fetch_variants(["ditto"]) == {"ditto": ("second/", b"ditto-png")}
+    assert time.perf_counter() - start < 1.0
+    fetcher.close()
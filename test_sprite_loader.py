@@ -0,0 +1,33 @@
+"""tests for SpriteFetcher against the local sprite server in conftest.py
+
+    python -m pytest test_sprite_loader.py
+"""
+from conftest import ADD_ONS
+from sprite_loader import SpriteCache
+
+
+def test_cached_sprite_is_served_without_a_request(server, tmp_path) -> None:
+    """A sprite found once is answered from disk, by a new cache and fetcher, with no HTTP request"""
+    server.serve("second/", "pikachu", b"pikachu-png")
+    fetcher = server.fetcher(SpriteCache(str(tmp_path)))
+    assert fetcher.fetch_variants(["pikachu"]) == {"pikachu": ("second/", b"pikachu-png")}
+    fetcher.close()
+    assert "/sprites/second/pikachu.png" in server.requested
+
+    server.requested.clear()
+    fetcher = server.fetcher(SpriteCache(str(tmp_path)))
+    assert fetcher.fetch_variants(["pikachu"]) == {"pikachu": ("second/", b"pikachu-png")}
+    fetcher.close()
+    assert server.requested == []
+
+
+def test_preferred_variant_wins_over_a_faster_fallback(server, tmp_path) -> None:
+    """Variants are requested at once, but a slower preferred variant still beats a fallback that answered first"""
+    server.serve("first/", "mew", b"first-png", delay=0.5)
+    server.serve("second/", "mew", b"second-png")
+    server.serve("third/", "mew", b"third-png")
+    fetcher = server.fetcher(SpriteCache(str(tmp_path)))
+    assert fetcher.fetch_variants(["mew", "pikachu"]) == {"mew": ("first/", b"first-png"), "pikachu": None}
+    fetcher.close()
+    # the fallbacks were requested alongside the preferred variant, not only after it failed
+    assert len([path for path in server.requested if "/mew.png" in path]) == len(ADD_ONS)